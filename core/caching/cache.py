@@ -1,5 +1,22 @@
+import asyncio
+import base64
+import binascii
 from abc import ABC
 from abc import abstractmethod
+from collections.abc import Mapping
+from collections.abc import Sequence
+
+import pydantic
+
+from core import logging
+from core.caching.cache_codec import CacheCodec
+from core.caching.cache_codec import CacheCodecException
+from core.caching.cache_codec import JsonCacheCodec
+from core.caching.cache_codec import get_type_adapter
+from core.exceptions import InternalServerErrorException
+
+_DEFAULT_CODEC = JsonCacheCodec()
+_BYTES_VALUE_PREFIX = 'kiba-bytes:'
 
 
 class Cache(ABC):
@@ -22,3 +39,58 @@ class Cache(ABC):
 
     @abstractmethod
     def can_store_complex_objects(self) -> bool: ...
+
+    # NOTE(krishan711): caches that can handle many keys at once more cheaply should override these, these defaults run the single key calls concurrently
+    async def get_many(self, keys: Sequence[str]) -> dict[str, str]:
+        """
+        Returned dict only contains the keys that were found
+        """
+        values = await asyncio.gather(*[self.get(key=key) for key in keys])
+        return {key: value for key, value in zip(keys, values, strict=True) if value is not None}
+
+    async def set_many(self, values: Mapping[str, str], expirySeconds: float) -> bool:
+        results = await asyncio.gather(*[self.set(key=key, value=value, expirySeconds=expirySeconds) for key, value in values.items()])
+        return all(results)
+
+    async def delete_many(self, keys: Sequence[str]) -> int:
+        """
+        Returned int is the number of records that were removed
+        """
+        results = await asyncio.gather(*[self.delete(key=key) for key in keys])
+        return sum(1 for wasDeleted in results if wasDeleted)
+
+    # NOTE(krishan711): get only returns values stored with set and get_bytes only ones stored with set_bytes, anything else is a miss.
+    # Caches that can store bytes natively should override these, this default stores them base64 encoded with a prefix so
+    # get_bytes can tell them apart (get can't so it returns the encoded string).
+    async def set_bytes(self, key: str, value: bytes, expirySeconds: float) -> bool:
+        return await self.set(key=key, value=f'{_BYTES_VALUE_PREFIX}{base64.b64encode(value).decode()}', expirySeconds=expirySeconds)
+
+    async def get_bytes(self, key: str) -> bytes | None:
+        value = await self.get(key=key)
+        if value is None or not value.startswith(_BYTES_VALUE_PREFIX):
+            return None
+        try:
+            return base64.b64decode(value.removeprefix(_BYTES_VALUE_PREFIX), validate=True)
+        except binascii.Error:
+            return None
+
+    def _get_codec(self, codec: CacheCodec | None) -> CacheCodec:
+        codec = codec or _DEFAULT_CODEC
+        if codec.requires_private_cache() and not self.isPrivate:
+            raise InternalServerErrorException(message=f'{codec.__class__.__name__} can only be used with private caches')
+        return codec
+
+    async def set_object(self, key: str, value: object, expirySeconds: float, codec: CacheCodec | None = None) -> bool:
+        return await self.set_bytes(key=key, value=self._get_codec(codec=codec).encode(value=value), expirySeconds=expirySeconds)
+
+    # NOTE(krishan711): values that can't be decoded into objectType (e.g. after the type has changed) are treated as missing
+    async def get_object[ObjectType](self, key: str, objectType: type[ObjectType], codec: CacheCodec | None = None) -> ObjectType | None:
+        codec = self._get_codec(codec=codec)
+        value = await self.get_bytes(key=key)
+        if value is None:
+            return None
+        try:
+            return get_type_adapter(objectType=objectType).validate_python(codec.decode(value=value))
+        except (CacheCodecException, pydantic.ValidationError) as exception:
+            logging.warning(f'Failed to decode cached value for {key} as {objectType}: {exception}')
+            return None
@@ -0,0 +1,70 @@
+import pickle
+import typing
+from abc import ABC
+from abc import abstractmethod
+
+import orjson
+import pydantic
+import pydantic_core
+
+from core.exceptions import KibaException
+
+
+class CacheCodecException(KibaException):
+    pass
+
+
+class CacheCodec(ABC):
+    @abstractmethod
+    def encode(self, value: object) -> bytes: ...
+
+    @abstractmethod
+    def decode(self, value: bytes) -> object: ...
+
+    def requires_private_cache(self) -> bool:
+        return False
+
+
+class JsonCacheCodec(CacheCodec):
+    # NOTE(krishan711): orjson handles datetimes and dataclasses itself and only calls the default for other types (e.g. pydantic models)
+    def encode(self, value: object) -> bytes:
+        try:
+            return orjson.dumps(value, default=pydantic_core.to_jsonable_python)
+        except (TypeError, pydantic_core.PydanticSerializationError) as exception:
+            raise CacheCodecException(message=str(exception)) from exception
+
+    def decode(self, value: bytes) -> object:
+        try:
+            return orjson.loads(value)
+        except orjson.JSONDecodeError as exception:
+            raise CacheCodecException(message=str(exception)) from exception
+
+
+class PickleCacheCodec(CacheCodec):
+    # NOTE(krishan711): unpickling can run arbitrary code so this can only be used with private caches (i.e. ones no-one else can write to)
+    def encode(self, value: object) -> bytes:
+        try:
+            return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError) as exception:
+            raise CacheCodecException(message=str(exception)) from exception
+
+    def decode(self, value: bytes) -> object:
+        try:
+            return pickle.loads(value)  # noqa: S301
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, IndexError, TypeError, ValueError) as exception:
+            raise CacheCodecException(message=str(exception)) from exception
+
+    def requires_private_cache(self) -> bool:
+        return True
+
+
+_TYPE_ADAPTERS: dict[object, object] = {}
+
+
+# NOTE(krishan711): creating a TypeAdapter builds a validator for the type so they are created once and reused
+def get_type_adapter[ObjectType](objectType: type[ObjectType]) -> pydantic.TypeAdapter[ObjectType]:
+    typeAdapter = _TYPE_ADAPTERS.get(objectType)
+    if typeAdapter is None:
+        typeAdapter = pydantic.TypeAdapter(objectType)
+        _TYPE_ADAPTERS[objectType] = typeAdapter
+    return typing.cast(pydantic.TypeAdapter[ObjectType], typeAdapter)
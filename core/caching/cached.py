@@ -0,0 +1,105 @@
+import asyncio
+import dataclasses
+import functools
+import hashlib
+import inspect
+import math
+import random
+import time
+import typing
+from collections.abc import Awaitable
+from collections.abc import Callable
+
+from core import logging
+from core.caching.cache import Cache
+from core.caching.cache_codec import CacheCodec
+from core.exceptions import InternalServerErrorException
+from core.util import date_util
+
+
+@dataclasses.dataclass
+class CachedValue[ValueType]:
+    value: ValueType
+    expiryTimestamp: float
+    computeSeconds: float
+
+
+def _create_default_key(functionName: str, args: tuple[object, ...], kwargs: dict[str, object]) -> str:
+    # NOTE(krishan711): the arguments are hashed so the key is safe for any cache (e.g. FileCache uses it as a directory name).
+    # Arguments whose repr isn't stable across instances and processes (e.g. most objects) need a key function instead.
+    argumentsHash = hashlib.sha256(repr((args, sorted(kwargs.items()))).encode()).hexdigest()
+    return f'{functionName}:{argumentsHash}'
+
+
+def _log_refresh_failure(task: asyncio.Task[object]) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logging.warning(f'Failed to refresh cached value in the background: {task.exception()}')
+
+
+# NOTE(krishan711): concurrent calls that miss the cache for the same key share one call of the function (within this
+# process). Values are stored for ttl + staleTtl seconds, after ttl they are still returned for staleTtl seconds while
+# they are refreshed in the background. Before ttl a value is also refreshed in the background with a probability that
+# grows as it nears expiry and with how long the function took (the XFetch algorithm, earlyExpiryBeta=0 turns it off)
+# so hot keys are usually refreshed before they expire rather than all callers missing at once.
+def cached[**P, ReturnType](
+    cache: Cache,
+    *,
+    ttl: float,
+    key: Callable[P, str] | None = None,
+    staleTtl: float = 0,
+    earlyExpiryBeta: float = 1.0,
+    codec: CacheCodec | None = None,
+) -> Callable[[Callable[P, Awaitable[ReturnType]]], Callable[P, Awaitable[ReturnType]]]:
+    def decorator(func: Callable[P, Awaitable[ReturnType]]) -> Callable[P, Awaitable[ReturnType]]:
+        functionName = f'{func.__module__}.{func.__qualname__}'
+        # NOTE(krishan711): for methods the instance (or class) is left out of the default key so every instance shares the cached values
+        parameterNames = list(inspect.signature(func).parameters)
+        isMethod = len(parameterNames) > 0 and parameterNames[0] in {'self', 'cls'}
+        inflightTasks: dict[str, asyncio.Task[ReturnType]] = {}
+        cachedValueTypes: list[type[CachedValue[ReturnType]]] = []
+
+        def get_cached_value_type() -> type[CachedValue[ReturnType]]:
+            # NOTE(krishan711): this is resolved on first use so return types defined after the function still work
+            if not cachedValueTypes:
+                returnType = typing.get_type_hints(func).get('return')
+                if returnType is None:
+                    raise InternalServerErrorException(message=f'Functions decorated with cached must have a return type annotation: {functionName}')
+                cachedValueTypes.append(CachedValue[returnType])  # type: ignore[valid-type]
+            return cachedValueTypes[0]
+
+        async def compute(cacheKey: str, *args: P.args, **kwargs: P.kwargs) -> ReturnType:
+            startTime = time.perf_counter()
+            value = await func(*args, **kwargs)
+            cachedValue = CachedValue(
+                value=value,
+                expiryTimestamp=date_util.datetime_from_now(seconds=ttl).timestamp(),
+                computeSeconds=time.perf_counter() - startTime,
+            )
+            await cache.set_object(key=cacheKey, value=cachedValue, expirySeconds=ttl + staleTtl, codec=codec)
+            return value
+
+        def start_compute(cacheKey: str, *args: P.args, **kwargs: P.kwargs) -> asyncio.Task[ReturnType]:
+            task = asyncio.create_task(compute(cacheKey, *args, **kwargs))
+            inflightTasks[cacheKey] = task
+            task.add_done_callback(lambda _: inflightTasks.pop(cacheKey, None))
+            return task
+
+        @functools.wraps(func)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> ReturnType:
+            cacheKey = key(*args, **kwargs) if key else _create_default_key(functionName=functionName, args=args[1:] if isMethod else args, kwargs=kwargs)
+            cachedValue = await cache.get_object(key=cacheKey, objectType=get_cached_value_type(), codec=codec)
+            if cachedValue is not None:
+                nowTimestamp = date_util.datetime_from_now().timestamp()
+                isStale = nowTimestamp >= cachedValue.expiryTimestamp
+                # NOTE(krishan711): 1 - random() is used as log(0) is undefined
+                shouldRefreshEarly = earlyExpiryBeta > 0 and nowTimestamp - cachedValue.computeSeconds * earlyExpiryBeta * math.log(1 - random.random()) >= cachedValue.expiryTimestamp  # noqa: S311
+                if (isStale or shouldRefreshEarly) and cacheKey not in inflightTasks:
+                    start_compute(cacheKey, *args, **kwargs).add_done_callback(_log_refresh_failure)
+                return cachedValue.value
+            task = inflightTasks.get(cacheKey) or start_compute(cacheKey, *args, **kwargs)
+            # NOTE(krishan711): shielded so one caller being cancelled doesn't cancel the computation for the others
+            return await asyncio.shield(task)
+
+        return wrapper
+
+    return decorator
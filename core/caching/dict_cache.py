@@ -1,47 +1,171 @@
 from __future__ import annotations
 
+import collections
 import dataclasses
 import datetime
-from collections.abc import MutableMapping
+import heapq
+import itertools
+import sys
+from collections.abc import Mapping
+from collections.abc import Sequence
 
 from core.caching.cache import Cache
 from core.util import date_util
 
 
+@dataclasses.dataclass
+class DictCacheStats:
+    entryCount: int
+    byteCount: int
+    hitCount: int
+    missCount: int
+    evictionCount: int
+    expiryCount: int
+
+
 class DictCache(Cache):
     @dataclasses.dataclass
     class CacheEntry:
-        value: str
+        value: str | bytes
         expiryDate: datetime.datetime
+        byteCount: int = 0
+        version: int = 0
 
-    def __init__(self, isPrivate: bool = False) -> None:
+    # NOTE(krishan711): when maxEntryCount or maxByteCount is reached the least recently used entries are evicted. Expired
+    # entries are removed when read and also swept (using a heap ordered by expiry) every expirySweepInterval sets so
+    # entries that are never read again don't stay around forever. Byte counts are shallow estimates from sys.getsizeof.
+    def __init__(self, isPrivate: bool = False, maxEntryCount: int | None = None, maxByteCount: int | None = None, expirySweepInterval: int = 100) -> None:
         super().__init__(isPrivate=isPrivate)
-        self._entries: MutableMapping[str, DictCache.CacheEntry] = {}
+        self.maxEntryCount = maxEntryCount
+        self.maxByteCount = maxByteCount
+        self.expirySweepInterval = expirySweepInterval
+        self._entries: collections.OrderedDict[str, DictCache.CacheEntry] = collections.OrderedDict()
+        self._expiryHeap: list[tuple[datetime.datetime, int, str]] = []
+        self._versionCounter = itertools.count()
+        self._setCountSinceSweep = 0
+        self._byteCount = 0
+        self._hitCount = 0
+        self._missCount = 0
+        self._evictionCount = 0
+        self._expiryCount = 0
 
-    async def set(self, key: str, value: str, expirySeconds: float) -> bool:
-        self._entries[key] = DictCache.CacheEntry(
+    def _remove_entry(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._byteCount -= entry.byteCount
+
+    def _sweep_expired_entries(self) -> None:
+        now = date_util.datetime_from_now()
+        while self._expiryHeap and self._expiryHeap[0][0] < now:
+            _, version, key = heapq.heappop(self._expiryHeap)
+            entry = self._entries.get(key)
+            # NOTE(krishan711): heap items for keys that have since been set again or deleted are just skipped
+            if entry is not None and entry.version == version:
+                self._remove_entry(key=key)
+                self._expiryCount += 1
+        if len(self._expiryHeap) > 2 * len(self._entries) + self.expirySweepInterval:
+            self._expiryHeap = [(entry.expiryDate, entry.version, key) for key, entry in self._entries.items()]
+            heapq.heapify(self._expiryHeap)
+
+    def _evict_entries(self) -> None:
+        while self._entries and ((self.maxEntryCount is not None and len(self._entries) > self.maxEntryCount) or (self.maxByteCount is not None and self._byteCount > self.maxByteCount)):
+            self._remove_entry(key=next(iter(self._entries)))
+            self._evictionCount += 1
+
+    def _internal_set(self, key: str, value: str | bytes, expirySeconds: float) -> None:
+        if key in self._entries:
+            self._remove_entry(key=key)
+        entry = DictCache.CacheEntry(
             value=value,
             expiryDate=date_util.datetime_from_now(seconds=expirySeconds),
+            byteCount=sys.getsizeof(key) + sys.getsizeof(value),
+            version=next(self._versionCounter),
         )
+        self._entries[key] = entry
+        self._byteCount += entry.byteCount
+        heapq.heappush(self._expiryHeap, (entry.expiryDate, entry.version, key))
+        self._setCountSinceSweep += 1
+        if self._setCountSinceSweep >= self.expirySweepInterval:
+            self._setCountSinceSweep = 0
+            self._sweep_expired_entries()
+        self._evict_entries()
+
+    async def set(self, key: str, value: str, expirySeconds: float) -> bool:
+        self._internal_set(key=key, value=value, expirySeconds=expirySeconds)
         return True
 
-    def _internal_get(self, key: str) -> str | None:
+    async def set_bytes(self, key: str, value: bytes, expirySeconds: float) -> bool:
+        self._internal_set(key=key, value=value, expirySeconds=expirySeconds)
+        return True
+
+    def _internal_get(self, key: str) -> str | bytes | None:
         entry = self._entries.get(key)
         if not entry:
             return None
         if entry.expiryDate < date_util.datetime_from_now():
-            del self._entries[key]
+            self._remove_entry(key=key)
+            self._expiryCount += 1
             return None
+        self._entries.move_to_end(key)
         return entry.value
 
+    def _record_get(self, value: str | bytes | None) -> None:
+        if value is None:
+            self._missCount += 1
+        else:
+            self._hitCount += 1
+
+    def _get_string(self, key: str) -> str | None:
+        value = self._internal_get(key=key)
+        # NOTE(krishan711): a value stored with set_bytes is not returned from get (and vice versa)
+        if not isinstance(value, str):
+            value = None
+        self._record_get(value=value)
+        return value
+
     async def get(self, key: str) -> str | None:
-        return self._internal_get(key=key)
+        return self._get_string(key=key)
 
-    async def delete(self, key: str) -> bool:
+    async def get_many(self, keys: Sequence[str]) -> dict[str, str]:
+        values: dict[str, str] = {}
+        for key in keys:
+            value = self._get_string(key=key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    async def set_many(self, values: Mapping[str, str], expirySeconds: float) -> bool:
+        for key, value in values.items():
+            self._internal_set(key=key, value=value, expirySeconds=expirySeconds)
+        return True
+
+    async def get_bytes(self, key: str) -> bytes | None:
+        value = self._internal_get(key=key)
+        if not isinstance(value, bytes):
+            value = None
+        self._record_get(value=value)
+        return value
+
+    def _internal_delete(self, key: str) -> bool:
         ret = self._internal_get(key=key)
-        if ret:
-            del self._entries[key]
+        if ret is not None:
+            self._remove_entry(key=key)
         return ret is not None
 
+    async def delete(self, key: str) -> bool:
+        return self._internal_delete(key=key)
+
+    async def delete_many(self, keys: Sequence[str]) -> int:
+        return sum(1 for key in keys if self._internal_delete(key=key))
+
     def can_store_complex_objects(self) -> bool:  # pylint: disable=no-self-use
         return True
+
+    def get_stats(self) -> DictCacheStats:
+        return DictCacheStats(
+            entryCount=len(self._entries),
+            byteCount=self._byteCount,
+            hitCount=self._hitCount,
+            missCount=self._missCount,
+            evictionCount=self._evictionCount,
+            expiryCount=self._expiryCount,
+        )
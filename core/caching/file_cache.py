@@ -2,69 +2,140 @@ from __future__ import annotations
 
 import asyncio
 import os
+from collections.abc import Mapping
+from collections.abc import Sequence
 
 from core.caching.cache import Cache
 from core.util import date_util
 from core.util import file_util
 from core.util.date_util import DateConversionException
 
+# NOTE(krishan711): values from set and set_bytes are kept in different files so get only returns values stored with set and
+# get_bytes only ones stored with set_bytes (the same as DictCache and LogFileCache)
+_STRING_CONTENT_FILE_NAME = 'content.txt'
+_BYTES_CONTENT_FILE_NAME = 'content.bin'
+_CONTENT_FILE_NAMES = (_STRING_CONTENT_FILE_NAME, _BYTES_CONTENT_FILE_NAME)
+_EXPIRY_FILE_NAME = 'expiryDate.txt'
+
 
 class FileCache(Cache):
     def __init__(self, cacheDirectory: str, isPrivate: bool = False) -> None:
         super().__init__(isPrivate=isPrivate)
         self._cacheDirectory = cacheDirectory
 
-    async def set(self, key: str, value: str, expirySeconds: float) -> bool:
+    @staticmethod
+    def _remove_file_if_exists_sync(filePath: str) -> bool:
+        if not file_util.file_exists_sync(filePath=filePath):
+            return False
+        file_util.remove_file_sync(filePath=filePath)
+        return True
+
+    async def _internal_set(self, key: str, value: str | bytes, expirySeconds: float) -> None:
         cacheFileDirectory = os.path.join(self._cacheDirectory, key)
-        contentFilePath = os.path.join(cacheFileDirectory, 'content.txt')
-        expiryFilePath = os.path.join(cacheFileDirectory, 'expiryDate.txt')
+        isBytes = isinstance(value, bytes)
+        contentFilePath = os.path.join(cacheFileDirectory, _BYTES_CONTENT_FILE_NAME if isBytes else _STRING_CONTENT_FILE_NAME)
+        otherContentFilePath = os.path.join(cacheFileDirectory, _STRING_CONTENT_FILE_NAME if isBytes else _BYTES_CONTENT_FILE_NAME)
+        expiryFilePath = os.path.join(cacheFileDirectory, _EXPIRY_FILE_NAME)
         expiryDateString = date_util.datetime_to_string(dt=date_util.datetime_from_now(seconds=expirySeconds))
         await asyncio.gather(
             *[
-                file_util.write_file(filePath=contentFilePath, content=value),
+                file_util.write_file_bytes(filePath=contentFilePath, content=value) if isinstance(value, bytes) else file_util.write_file(filePath=contentFilePath, content=value),
                 file_util.write_file(filePath=expiryFilePath, content=expiryDateString),
+                asyncio.to_thread(self._remove_file_if_exists_sync, otherContentFilePath),
             ]
         )
+
+    async def set(self, key: str, value: str, expirySeconds: float) -> bool:
+        await self._internal_set(key=key, value=value, expirySeconds=expirySeconds)
         return True
 
-    async def _internal_get(self, key: str) -> str | None:
+    async def set_bytes(self, key: str, value: bytes, expirySeconds: float) -> bool:
+        await self._internal_set(key=key, value=value, expirySeconds=expirySeconds)
+        return True
+
+    def _get_content_file_path_sync(self, key: str, contentFileName: str = _STRING_CONTENT_FILE_NAME) -> str | None:
         cacheFileDirectory = os.path.join(self._cacheDirectory, key)
-        contentFilePath = os.path.join(cacheFileDirectory, 'content.txt')
-        expiryFilePath = os.path.join(cacheFileDirectory, 'expiryDate.txt')
-        contentFileExists = await file_util.file_exists(filePath=contentFilePath)
-        expiryFileExists = await file_util.file_exists(filePath=expiryFilePath)
+        contentFilePath = os.path.join(cacheFileDirectory, contentFileName)
+        expiryFilePath = os.path.join(cacheFileDirectory, _EXPIRY_FILE_NAME)
+        contentFileExists = file_util.file_exists_sync(filePath=contentFilePath)
+        expiryFileExists = file_util.file_exists_sync(filePath=expiryFilePath)
         if not contentFileExists:
-            if expiryFileExists:
-                await file_util.remove_file(filePath=expiryFilePath)
+            if expiryFileExists and not any(file_util.file_exists_sync(filePath=os.path.join(cacheFileDirectory, otherContentFileName)) for otherContentFileName in _CONTENT_FILE_NAMES):
+                file_util.remove_file_sync(filePath=expiryFilePath)
             return None
         if not expiryFileExists:
             if contentFileExists:
-                await file_util.remove_file(filePath=contentFilePath)
+                file_util.remove_file_sync(filePath=contentFilePath)
             return None
-        expiryDateString = await file_util.read_file(filePath=expiryFilePath)
+        expiryDateString = file_util.read_file_sync(filePath=expiryFilePath)
         try:
             expiryDate = date_util.datetime_from_string(dateString=expiryDateString.strip())
             if expiryDate < date_util.datetime_from_now():
-                await file_util.remove_file(filePath=contentFilePath)
-                await file_util.remove_file(filePath=expiryFilePath)
+                file_util.remove_file_sync(filePath=contentFilePath)
+                file_util.remove_file_sync(filePath=expiryFilePath)
                 return None
         except DateConversionException:
-            await file_util.remove_file(filePath=contentFilePath)
-            await file_util.remove_file(filePath=expiryFilePath)
+            file_util.remove_file_sync(filePath=contentFilePath)
+            file_util.remove_file_sync(filePath=expiryFilePath)
+            return None
+        return contentFilePath
+
+    async def _get_content_file_path(self, key: str, contentFileName: str = _STRING_CONTENT_FILE_NAME) -> str | None:
+        # NOTE(krishan711): the checks are done together in one thread rather than each file call being sent to a thread separately
+        return await asyncio.to_thread(self._get_content_file_path_sync, key, contentFileName)
+
+    async def _internal_get(self, key: str) -> str | None:
+        contentFilePath = await self._get_content_file_path(key=key)
+        if contentFilePath is None:
             return None
         return await file_util.read_file(filePath=contentFilePath)
 
     async def get(self, key: str) -> str | None:
         return await self._internal_get(key=key)
 
-    async def delete(self, key: str) -> bool:
-        # NOTE(krishan711): we only delete content file for speed
+    def _get_many_sync(self, keys: Sequence[str]) -> dict[str, str]:
+        values: dict[str, str] = {}
+        for key in keys:
+            contentFilePath = self._get_content_file_path_sync(key=key)
+            if contentFilePath is not None:
+                values[key] = file_util.read_file_sync(filePath=contentFilePath)
+        return values
+
+    async def get_many(self, keys: Sequence[str]) -> dict[str, str]:
+        return await asyncio.to_thread(self._get_many_sync, keys)
+
+    def _set_many_sync(self, values: Mapping[str, str], expirySeconds: float) -> None:
+        expiryDateString = date_util.datetime_to_string(dt=date_util.datetime_from_now(seconds=expirySeconds))
+        for key, value in values.items():
+            cacheFileDirectory = os.path.join(self._cacheDirectory, key)
+            file_util.write_file_sync(filePath=os.path.join(cacheFileDirectory, _STRING_CONTENT_FILE_NAME), content=value)
+            file_util.write_file_sync(filePath=os.path.join(cacheFileDirectory, _EXPIRY_FILE_NAME), content=expiryDateString)
+            self._remove_file_if_exists_sync(filePath=os.path.join(cacheFileDirectory, _BYTES_CONTENT_FILE_NAME))
+
+    async def set_many(self, values: Mapping[str, str], expirySeconds: float) -> bool:
+        await asyncio.to_thread(self._set_many_sync, values, expirySeconds)
+        return True
+
+    async def get_bytes(self, key: str) -> bytes | None:
+        contentFilePath = await self._get_content_file_path(key=key, contentFileName=_BYTES_CONTENT_FILE_NAME)
+        if contentFilePath is None:
+            return None
+        return await file_util.read_file_bytes(filePath=contentFilePath)
+
+    def _delete_sync(self, key: str) -> bool:
+        # NOTE(krishan711): we only delete content files for speed
         cacheFileDirectory = os.path.join(self._cacheDirectory, key)
-        contentFilePath = os.path.join(cacheFileDirectory, 'content.txt')
-        fileExists = await file_util.file_exists(filePath=contentFilePath)
-        if fileExists:
-            await file_util.remove_file(filePath=contentFilePath)
-        return fileExists
+        removedResults = [self._remove_file_if_exists_sync(filePath=os.path.join(cacheFileDirectory, contentFileName)) for contentFileName in _CONTENT_FILE_NAMES]
+        return any(removedResults)
+
+    async def delete(self, key: str) -> bool:
+        return await asyncio.to_thread(self._delete_sync, key)
+
+    def _delete_many_sync(self, keys: Sequence[str]) -> int:
+        return sum(1 for key in keys if self._delete_sync(key=key))
+
+    async def delete_many(self, keys: Sequence[str]) -> int:
+        return await asyncio.to_thread(self._delete_many_sync, keys)
 
     def can_store_complex_objects(self) -> bool:
         return False
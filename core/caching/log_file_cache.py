@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import mmap
+import os
+import struct
+from typing import BinaryIO
+
+from core import logging
+from core.caching.cache import Cache
+from core.util import date_util
+
+# NOTE(krishan711): each record is this header (expiry timestamp, key length, value length, whether the value was stored with
+# set_bytes) followed by the key and value bytes. get only returns values stored with set and get_bytes only ones stored with set_bytes.
+_RECORD_HEADER = struct.Struct('<dII?')
+_DELETED_VALUE_LENGTH = 0xFFFFFFFF
+_LOG_FILE_NAME = 'cache.log'
+
+
+class LogFileCache(Cache):
+    @dataclasses.dataclass
+    class IndexEntry:
+        valueOffset: int
+        valueLength: int
+        expiryTimestamp: float
+        isBytes: bool
+
+    # NOTE(krishan711): this stores every entry in a single append-only log file with the expiry inline, and keeps an
+    # in-memory index of where each key's latest value is so a read is a dict lookup and a slice of an mmap of the log.
+    # The index is rebuilt by scanning the log when the cache is first used, and the log is rewritten with only the live
+    # entries once more than half of it (and at least minCompactionByteCount) is overwritten, deleted or expired entries.
+    # Writes are small appends to the page cache so they are done inline, loading and compacting scan or rewrite the
+    # whole log so they are done in a thread (with the lock held so nothing else touches the files meanwhile). The index
+    # is per process so a cacheDirectory must only be used by one process at a time.
+    def __init__(self, cacheDirectory: str, isPrivate: bool = False, minCompactionByteCount: int = 10 * 1024 * 1024) -> None:
+        super().__init__(isPrivate=isPrivate)
+        self._cacheDirectory = cacheDirectory
+        self.minCompactionByteCount = minCompactionByteCount
+        self._logFilePath = os.path.join(cacheDirectory, _LOG_FILE_NAME)
+        self._index: dict[str, LogFileCache.IndexEntry] = {}
+        self._logFile: BinaryIO | None = None
+        self._logByteCount = 0
+        self._liveByteCount = 0
+        self._mmap: mmap.mmap | None = None
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _get_record_byte_count(keyLength: int, valueLength: int) -> int:
+        return _RECORD_HEADER.size + keyLength + valueLength
+
+    def _load_index(self) -> None:
+        self._index = {}
+        self._liveByteCount = 0
+        validByteCount = 0
+        if os.path.exists(self._logFilePath) and os.path.getsize(self._logFilePath) > 0:
+            # NOTE(krishan711): the log is scanned through an mmap so it isn't all read into memory at once
+            with open(self._logFilePath, 'rb') as logFile, mmap.mmap(logFile.fileno(), length=0, access=mmap.ACCESS_READ) as content:
+                validByteCount = self._scan_log(content=content)
+        os.makedirs(self._cacheDirectory, exist_ok=True)
+        self._logFile = open(self._logFilePath, 'ab')  # noqa: SIM115
+        self._logFile.truncate(validByteCount)
+        self._logByteCount = validByteCount
+
+    def _scan_log(self, content: mmap.mmap) -> int:
+        offset = 0
+        while offset + _RECORD_HEADER.size <= len(content):
+            expiryTimestamp, keyLength, valueLength, isBytes = _RECORD_HEADER.unpack_from(content, offset)
+            isDeleted = valueLength == _DELETED_VALUE_LENGTH
+            recordByteCount = self._get_record_byte_count(keyLength=keyLength, valueLength=0 if isDeleted else valueLength)
+            if offset + recordByteCount > len(content):
+                break
+            keyStart = offset + _RECORD_HEADER.size
+            try:
+                key = content[keyStart : keyStart + keyLength].decode()
+            except UnicodeDecodeError:
+                break
+            self._remove_index_entry(key=key)
+            if not isDeleted:
+                self._index[key] = LogFileCache.IndexEntry(valueOffset=keyStart + keyLength, valueLength=valueLength, expiryTimestamp=expiryTimestamp, isBytes=isBytes)
+                self._liveByteCount += recordByteCount
+            offset += recordByteCount
+        if offset < len(content):
+            # NOTE(krishan711): a partly written record at the end (e.g. from a crash) is dropped
+            logging.warning(f'Truncating {len(content) - offset} invalid bytes from the end of {self._logFilePath}')
+        return offset
+
+    async def _ensure_loaded(self) -> None:
+        if self._logFile is None:
+            await asyncio.to_thread(self._load_index)
+
+    def _get_log_file(self) -> BinaryIO:
+        if self._logFile is None:
+            self._load_index()
+        return self._logFile  # type: ignore[return-value]
+
+    def _remove_index_entry(self, key: str) -> None:
+        entry = self._index.pop(key, None)
+        if entry is not None:
+            self._liveByteCount -= self._get_record_byte_count(keyLength=len(key.encode()), valueLength=entry.valueLength)
+
+    def _append_record(self, key: str, value: bytes | None, expiryTimestamp: float, isBytes: bool = False) -> None:
+        logFile = self._get_log_file()
+        keyBytes = key.encode()
+        valueBytes = value or b''
+        valueLength = _DELETED_VALUE_LENGTH if value is None else len(valueBytes)
+        logFile.write(_RECORD_HEADER.pack(expiryTimestamp, len(keyBytes), valueLength, isBytes) + keyBytes + valueBytes)
+        logFile.flush()
+        self._remove_index_entry(key=key)
+        if value is not None:
+            self._index[key] = LogFileCache.IndexEntry(valueOffset=self._logByteCount + _RECORD_HEADER.size + len(keyBytes), valueLength=len(valueBytes), expiryTimestamp=expiryTimestamp, isBytes=isBytes)
+            self._liveByteCount += self._get_record_byte_count(keyLength=len(keyBytes), valueLength=len(valueBytes))
+        self._logByteCount += self._get_record_byte_count(keyLength=len(keyBytes), valueLength=len(valueBytes))
+
+    def _read_value(self, entry: LogFileCache.IndexEntry) -> bytes:
+        valueEnd = entry.valueOffset + entry.valueLength
+        if self._mmap is None or len(self._mmap) < valueEnd:
+            if self._mmap is not None:
+                self._mmap.close()
+            with open(self._logFilePath, 'rb') as logFile:
+                self._mmap = mmap.mmap(logFile.fileno(), length=0, access=mmap.ACCESS_READ)
+        return self._mmap[entry.valueOffset : valueEnd]
+
+    def _close_files(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._logFile is not None:
+            self._logFile.close()
+            self._logFile = None
+
+    def _compact(self) -> None:
+        nowTimestamp = date_util.datetime_from_now().timestamp()
+        compactedFilePath = f'{self._logFilePath}.compacting'
+        with open(compactedFilePath, 'wb') as compactedFile:
+            for key, entry in self._index.items():
+                if entry.expiryTimestamp < nowTimestamp:
+                    continue
+                keyBytes = key.encode()
+                compactedFile.write(_RECORD_HEADER.pack(entry.expiryTimestamp, len(keyBytes), entry.valueLength, entry.isBytes) + keyBytes + self._read_value(entry=entry))
+        self._close_files()
+        os.replace(compactedFilePath, self._logFilePath)
+        self._load_index()
+
+    def _should_compact(self) -> bool:
+        return self._logByteCount >= self.minCompactionByteCount and self._logByteCount > 2 * self._liveByteCount
+
+    def close(self) -> None:
+        self._close_files()
+        self._index = {}
+
+    async def _internal_set(self, key: str, value: bytes, expirySeconds: float, isBytes: bool) -> None:
+        async with self._lock:
+            await self._ensure_loaded()
+            self._append_record(key=key, value=value, expiryTimestamp=date_util.datetime_from_now(seconds=expirySeconds).timestamp(), isBytes=isBytes)
+            if self._should_compact():
+                await asyncio.to_thread(self._compact)
+
+    async def set_bytes(self, key: str, value: bytes, expirySeconds: float) -> bool:
+        await self._internal_set(key=key, value=value, expirySeconds=expirySeconds, isBytes=True)
+        return True
+
+    async def set(self, key: str, value: str, expirySeconds: float) -> bool:
+        await self._internal_set(key=key, value=value.encode(), expirySeconds=expirySeconds, isBytes=False)
+        return True
+
+    async def _internal_get(self, key: str, isBytes: bool) -> bytes | None:
+        async with self._lock:
+            await self._ensure_loaded()
+            entry = self._get_entry(key=key)
+            if entry is None or entry.isBytes != isBytes:
+                return None
+            return self._read_value(entry=entry)
+
+    def _get_entry(self, key: str) -> LogFileCache.IndexEntry | None:
+        entry = self._index.get(key)
+        if entry is None:
+            return None
+        if entry.expiryTimestamp < date_util.datetime_from_now().timestamp():
+            self._remove_index_entry(key=key)
+            return None
+        return entry
+
+    async def get_bytes(self, key: str) -> bytes | None:
+        return await self._internal_get(key=key, isBytes=True)
+
+    async def get(self, key: str) -> str | None:
+        value = await self._internal_get(key=key, isBytes=False)
+        return value.decode() if value is not None else None
+
+    async def delete(self, key: str) -> bool:
+        async with self._lock:
+            await self._ensure_loaded()
+            if self._get_entry(key=key) is None:
+                return False
+            self._append_record(key=key, value=None, expiryTimestamp=0)
+        return True
+
+    def can_store_complex_objects(self) -> bool:
+        return False
@@ -0,0 +1,20 @@
+import msgpack  # type: ignore[import-untyped]
+import pydantic_core
+
+from core.caching.cache_codec import CacheCodec
+from core.caching.cache_codec import CacheCodecException
+
+
+class MsgpackCacheCodec(CacheCodec):
+    # NOTE(krishan711): msgpack only calls the default for types it doesn't support (e.g. datetimes, dataclasses and pydantic models)
+    def encode(self, value: object) -> bytes:
+        try:
+            return msgpack.packb(value, default=pydantic_core.to_jsonable_python)  # type: ignore[no-any-return]
+        except (TypeError, ValueError, OverflowError, pydantic_core.PydanticSerializationError) as exception:
+            raise CacheCodecException(message=str(exception)) from exception
+
+    def decode(self, value: bytes) -> object:
+        try:
+            return msgpack.unpackb(value)
+        except (msgpack.UnpackException, TypeError, ValueError) as exception:
+            raise CacheCodecException(message=str(exception)) from exception
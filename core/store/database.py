@@ -1,23 +1,88 @@
+import asyncio
 import contextlib
 import contextvars
+import dataclasses
+import itertools
+import random
+import time
 import typing
 from collections.abc import AsyncIterator
+from collections.abc import Awaitable
+from collections.abc import Callable
+from collections.abc import Mapping
+from collections.abc import Sequence
+from typing import Any
 from typing import TypeVar
 
 import sqlalchemy
 from sqlalchemy.engine import Result
+from sqlalchemy.engine import Row
 from sqlalchemy.ext.asyncio import AsyncConnection
 from sqlalchemy.ext.asyncio import AsyncEngine
 from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import ConnectionPoolEntry
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql import CompoundSelect
+from sqlalchemy.sql import Select
 from sqlalchemy.sql.selectable import TypedReturnsRows
 
 from core import logging
 from core.exceptions import InternalServerErrorException
+from core.store.query_stats import QueryStatsRecorder
 
 DatabaseConnection = AsyncConnection
 ResultType = TypeVar('ResultType', bound=tuple)  # type: ignore[type-arg]
 
 
+@dataclasses.dataclass
+class DatabaseConnectionConfig:
+    poolSize: int = 100
+    maxOverflow: int = 10
+    poolTimeoutSeconds: float = 30
+    poolRecycleSeconds: int = 3600
+    shouldPrePing: bool = True
+    # NOTE(krishan711): these two only apply to postgres (asyncpg) connections
+    preparedStatementCacheSize: int | None = None
+    statementTimeoutSeconds: float | None = None
+    warmupConnectionCount: int = 0
+
+
+@dataclasses.dataclass
+class DatabaseRetryConfig:
+    maxAttemptCount: int = 3
+    initialBackoffSeconds: float = 0.05
+    maxBackoffSeconds: float = 2.0
+
+
+# NOTE(krishan711): serialization failures, deadlocks and the connection exception / operator intervention classes
+# (i.e. the server went away or is failing over). Anything else is assumed to need a code or data fix.
+_TRANSIENT_SQLSTATES = {'40001', '40P01', '57P01', '57P02', '57P03'}
+_TRANSIENT_SQLSTATE_CLASSES = {'08'}
+_TRANSIENT_ERROR_MESSAGES = ('database is locked', 'connection was closed', 'connection is closed', 'connection reset')
+
+
+@dataclasses.dataclass
+class DatabasePoolStats:
+    name: str
+    poolSize: int = 0
+    checkedOutCount: int = 0
+    overflowCount: int = 0
+    acquireCount: int = 0
+    totalAcquireSeconds: float = 0
+    maxAcquireSeconds: float = 0
+    openedConnectionCount: int = 0
+    closedConnectionCount: int = 0
+    totalConnectionLifetimeSeconds: float = 0
+    prePingFailureCount: int = 0
+
+
+@dataclasses.dataclass
+class _ContextReadState:
+    exitStack: contextlib.AsyncExitStack
+    connection: DatabaseConnection | None = None
+    hasWritten: bool = False
+
+
 class Database:
     @staticmethod
     def create_connection_string(engine: str, username: str, password: str, host: str, port: str, name: str) -> str:
@@ -31,34 +96,265 @@ class Database:
     def create_sqlite_connection_string(filename: str) -> str:
         return f'sqlite+aiosqlite:///{filename}'
 
-    def __init__(self, connectionString: str) -> None:
+    def __init__(self, connectionString: str, replicaConnectionStrings: Sequence[str] | None = None, shouldReadYourWrites: bool = True, queryStatsRecorder: QueryStatsRecorder | None = None, retryConfig: DatabaseRetryConfig | None = None) -> None:
         self.connectionString = connectionString
+        self.replicaConnectionStrings = replicaConnectionStrings or []
+        self.shouldReadYourWrites = shouldReadYourWrites
+        self.queryStatsRecorder = queryStatsRecorder
+        self.retryConfig = retryConfig or DatabaseRetryConfig()
         self._engine: AsyncEngine | None = None
+        self._replicaEngines: list[AsyncEngine] = []
+        self._replicaEngineIndexCounter = itertools.count()
+        self._enginePoolStats: dict[AsyncEngine, DatabasePoolStats] = {}
         self._connectionContext = contextvars.ContextVar[DatabaseConnection | None]('_connectionContext')
+        self._readStateContext = contextvars.ContextVar[_ContextReadState | None]('_readStateContext')
+        self._connectionAfterCommitCallbacks: dict[DatabaseConnection, list[Callable[[], Awaitable[None]]]] = {}
+
+    def get_dialect_name(self) -> str:
+        return sqlalchemy.engine.make_url(self.connectionString).get_backend_name()
+
+    @staticmethod
+    def _create_engine(connectionString: str, config: DatabaseConnectionConfig) -> AsyncEngine:
+        connectArgs: dict[str, object] = {}
+        if sqlalchemy.engine.make_url(connectionString).get_backend_name() == 'postgresql':
+            if config.preparedStatementCacheSize is not None:
+                connectArgs['prepared_statement_cache_size'] = config.preparedStatementCacheSize
+            if config.statementTimeoutSeconds is not None:
+                connectArgs['server_settings'] = {'statement_timeout': str(int(config.statementTimeoutSeconds * 1000))}
+        return create_async_engine(
+            connectionString,
+            # echo_pool=True,
+            # hide_parameters=False,
+            pool_size=config.poolSize,
+            max_overflow=config.maxOverflow,
+            pool_timeout=config.poolTimeoutSeconds,
+            pool_recycle=config.poolRecycleSeconds,
+            pool_pre_ping=config.shouldPrePing,
+            connect_args=connectArgs,
+        )
+
+    # NOTE(krishan711): opening connections up front means the first requests don't pay for connection setup
+    @staticmethod
+    async def _warm_up_engine(engine: AsyncEngine, connectionCount: int) -> None:
+        connections = [engine.connect() for _ in range(connectionCount)]
+        try:
+            await asyncio.gather(*[connection.start() for connection in connections])
+        finally:
+            await asyncio.gather(*[connection.close() for connection in connections if connection.sync_connection is not None])
+
+    def _instrument_engine(self, engine: AsyncEngine, name: str, shouldPrePing: bool) -> None:
+        poolStats = DatabasePoolStats(name=name)
+        self._enginePoolStats[engine] = poolStats
 
-    async def connect(self, poolSize: int = 100) -> None:
+        def on_connect(dbapiConnection: object, connectionRecord: ConnectionPoolEntry) -> None:  # noqa: ARG001
+            poolStats.openedConnectionCount += 1
+            connectionRecord.info['kibaConnectTime'] = time.monotonic()
+
+        def on_close(dbapiConnection: object, connectionRecord: ConnectionPoolEntry) -> None:  # noqa: ARG001
+            connectTime = connectionRecord.info.pop('kibaConnectTime', None)
+            if connectTime is not None:
+                poolStats.closedConnectionCount += 1
+                poolStats.totalConnectionLifetimeSeconds += time.monotonic() - connectTime
+
+        # NOTE(krishan711): with pre-ping on, disconnects found on checkout are almost always failed pre-pings. Without it they
+        # come from other checks so they aren't counted as pre-ping failures.
+        def on_invalidate(dbapiConnection: object, connectionRecord: ConnectionPoolEntry, exception: BaseException | None) -> None:  # noqa: ARG001
+            if shouldPrePing and isinstance(exception, sqlalchemy.exc.DisconnectionError):
+                poolStats.prePingFailureCount += 1
+                logging.stat(name='database_pool_pre_ping_failure', key=name)
+
+        sqlalchemy.event.listen(engine.sync_engine, 'connect', on_connect)
+        sqlalchemy.event.listen(engine.sync_engine, 'close', on_close)
+        sqlalchemy.event.listen(engine.sync_engine, 'invalidate', on_invalidate)
+        if self.queryStatsRecorder is not None:
+            self._instrument_engine_queries(engine=engine, queryStatsRecorder=self.queryStatsRecorder)
+
+    # NOTE(krishan711): these are engine events so they time every statement on every connection, not just ones run through execute()
+    @staticmethod
+    def _instrument_engine_queries(engine: AsyncEngine, queryStatsRecorder: QueryStatsRecorder) -> None:
+        def before_cursor_execute(connection: sqlalchemy.Connection, *args: object) -> None:  # noqa: ARG001
+            connection.info.setdefault('kibaQueryStartTimes', []).append(time.perf_counter())
+
+        def after_cursor_execute(connection: sqlalchemy.Connection, cursor: sqlalchemy.engine.interfaces.DBAPICursor, statement: str, *args: object) -> None:  # noqa: ARG001
+            queryStartTimes = connection.info.get('kibaQueryStartTimes')
+            if not queryStartTimes:
+                return
+            durationSeconds = time.perf_counter() - queryStartTimes.pop()
+            queryStatsRecorder.record_query(statement=statement, durationSeconds=durationSeconds, rowCount=cursor.rowcount)
+
+        # NOTE(krishan711): after_cursor_execute doesn't run for statements that fail so their start times are dropped here
+        def handle_error(exceptionContext: sqlalchemy.engine.ExceptionContext) -> None:
+            if exceptionContext.connection is None:
+                return
+            queryStartTimes = exceptionContext.connection.info.get('kibaQueryStartTimes')
+            if queryStartTimes:
+                queryStartTimes.pop()
+
+        sqlalchemy.event.listen(engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+        sqlalchemy.event.listen(engine.sync_engine, 'after_cursor_execute', after_cursor_execute)
+        sqlalchemy.event.listen(engine.sync_engine, 'handle_error', handle_error)
+
+    async def connect(self, poolSize: int | None = None, config: DatabaseConnectionConfig | None = None) -> None:
         if not self._engine:
-            self._engine = create_async_engine(
-                self.connectionString,
-                # echo_pool=True,
-                # hide_parameters=False,
-                pool_size=poolSize,
-                pool_recycle=3600,
-                pool_pre_ping=True,
-            )
+            config = config or DatabaseConnectionConfig()
+            if poolSize is not None:
+                config = dataclasses.replace(config, poolSize=poolSize)
+            self._engine = self._create_engine(connectionString=self.connectionString, config=config)
+            self._instrument_engine(engine=self._engine, name='primary', shouldPrePing=config.shouldPrePing)
+            self._replicaEngines = [self._create_engine(connectionString=replicaConnectionString, config=config) for replicaConnectionString in self.replicaConnectionStrings]
+            for index, replicaEngine in enumerate(self._replicaEngines):
+                self._instrument_engine(engine=replicaEngine, name=f'replica-{index}', shouldPrePing=config.shouldPrePing)
+            warmupConnectionCount = min(config.warmupConnectionCount, config.poolSize)
+            if warmupConnectionCount > 0:
+                await asyncio.gather(*[self._warm_up_engine(engine=engine, connectionCount=warmupConnectionCount) for engine in [self._engine, *self._replicaEngines]])
 
     async def disconnect(self) -> None:
         if self._engine:
             await self._engine.dispose()
             self._engine = None
+        for replicaEngine in self._replicaEngines:
+            await replicaEngine.dispose()
+        self._replicaEngines = []
+        self._enginePoolStats = {}
+
+    def get_pool_stats(self) -> list[DatabasePoolStats]:
+        allPoolStats: list[DatabasePoolStats] = []
+        for engine, poolStats in self._enginePoolStats.items():
+            pool = engine.sync_engine.pool
+            currentPoolStats = dataclasses.replace(poolStats)
+            if isinstance(pool, QueuePool):
+                currentPoolStats.poolSize = pool.size()
+                currentPoolStats.checkedOutCount = pool.checkedout()
+                currentPoolStats.overflowCount = max(pool.overflow(), 0)
+            allPoolStats.append(currentPoolStats)
+        return allPoolStats
+
+    def log_pool_stats(self) -> None:
+        for poolStats in self.get_pool_stats():
+            logging.stat(name='database_pool_size', key=poolStats.name, value=poolStats.poolSize)
+            logging.stat(name='database_pool_checked_out', key=poolStats.name, value=poolStats.checkedOutCount)
+            logging.stat(name='database_pool_overflow', key=poolStats.name, value=poolStats.overflowCount)
+            logging.stat(name='database_pool_acquire_count', key=poolStats.name, value=poolStats.acquireCount)
+            logging.stat(name='database_pool_acquire_seconds_average', key=poolStats.name, value=poolStats.totalAcquireSeconds / poolStats.acquireCount if poolStats.acquireCount else 0)
+            logging.stat(name='database_pool_acquire_seconds_max', key=poolStats.name, value=poolStats.maxAcquireSeconds)
+            logging.stat(name='database_pool_connection_lifetime_seconds_average', key=poolStats.name, value=poolStats.totalConnectionLifetimeSeconds / poolStats.closedConnectionCount if poolStats.closedConnectionCount else 0)
+            logging.stat(name='database_pool_pre_ping_failure_count', key=poolStats.name, value=poolStats.prePingFailureCount)
+
+    @staticmethod
+    def is_transient_error(exception: BaseException) -> bool:
+        currentException: BaseException | None = exception
+        while currentException is not None:
+            if isinstance(currentException, sqlalchemy.exc.DBAPIError) and currentException.connection_invalidated:
+                return True
+            if isinstance(currentException, (sqlalchemy.exc.DisconnectionError, ConnectionError)):
+                return True
+            if isinstance(currentException, sqlalchemy.exc.DBAPIError):
+                # NOTE(krishan711): asyncpg errors expose the code as sqlstate, psycopg ones as pgcode
+                sqlState = getattr(currentException.orig, 'sqlstate', None) or getattr(currentException.orig, 'pgcode', None)
+                if isinstance(sqlState, str) and (sqlState in _TRANSIENT_SQLSTATES or sqlState[:2] in _TRANSIENT_SQLSTATE_CLASSES):
+                    return True
+                if isinstance(currentException, (sqlalchemy.exc.OperationalError, sqlalchemy.exc.InterfaceError)):
+                    message = str(currentException.orig).lower()
+                    if any(transientMessage in message for transientMessage in _TRANSIENT_ERROR_MESSAGES):
+                        return True
+            currentException = currentException.__cause__ or currentException.__context__
+        return False
+
+    # NOTE(krishan711): full jitter (a random wait up to the exponential backoff) stops clients that failed together retrying together
+    @staticmethod
+    def _get_retry_backoff_seconds(retryConfig: DatabaseRetryConfig, attemptCount: int) -> float:
+        return random.uniform(0, min(retryConfig.maxBackoffSeconds, retryConfig.initialBackoffSeconds * (2 ** (attemptCount - 1))))  # noqa: S311
+
+    async def _connect(self, engine: AsyncEngine) -> DatabaseConnection:
+        attemptCount = 0
+        while True:
+            attemptCount += 1
+            connection = engine.connect()
+            try:
+                await connection.start()
+            except Exception as exception:
+                if attemptCount >= self.retryConfig.maxAttemptCount or not self.is_transient_error(exception=exception):
+                    raise
+                backoffSeconds = self._get_retry_backoff_seconds(retryConfig=self.retryConfig, attemptCount=attemptCount)
+                logging.info(f'Retrying database connection in {backoffSeconds:.3f}s after transient error: {exception!s}')
+                await asyncio.sleep(backoffSeconds)
+            else:
+                return connection
+
+    # NOTE(krishan711): this is the same as engine.begin() but times how long it takes to get a connection from the pool
+    @contextlib.asynccontextmanager
+    async def _begin(self, engine: AsyncEngine) -> AsyncIterator[DatabaseConnection]:
+        startTime = time.perf_counter()
+        # NOTE(krishan711): nothing has run on the connection yet so failing to get one is always safe to retry
+        connection = await self._connect(engine=engine)
+        try:
+            acquireSeconds = time.perf_counter() - startTime
+            poolStats = self._enginePoolStats.get(engine)
+            if poolStats is not None:
+                poolStats.acquireCount += 1
+                poolStats.totalAcquireSeconds += acquireSeconds
+                poolStats.maxAcquireSeconds = max(poolStats.maxAcquireSeconds, acquireSeconds)
+            async with connection.begin():
+                yield connection
+            # NOTE(krishan711): the transaction has already committed so callback errors are logged rather than raised
+            for callback in self._connectionAfterCommitCallbacks.pop(connection, []):
+                try:
+                    await callback()
+                except Exception as exception:  # noqa: BLE001
+                    logging.error('Caught exception whilst running after commit callback:')
+                    logging.exception(exception)
+        finally:
+            self._connectionAfterCommitCallbacks.pop(connection, None)
+            await connection.close()
+
+    # NOTE(krishan711): the callback is run once the transaction on connection has committed and is dropped if it rolls back.
+    # This is for work that must not happen before the writes are visible to other connections (e.g. invalidating caches).
+    def add_after_commit_callback(self, connection: DatabaseConnection, callback: Callable[[], Awaitable[None]]) -> None:
+        self._connectionAfterCommitCallbacks.setdefault(connection, []).append(callback)
+
+    def _get_read_engine(self) -> AsyncEngine:
+        if not self._engine:
+            raise InternalServerErrorException(message='Engine has not been established. Please called collect() first.')
+        if not self._replicaEngines:
+            return self._engine
+        return self._replicaEngines[next(self._replicaEngineIndexCounter) % len(self._replicaEngines)]
 
     @contextlib.asynccontextmanager
     async def create_transaction(self) -> AsyncIterator[DatabaseConnection]:
         if not self._engine:
             raise InternalServerErrorException(message='Engine has not been established. Please called collect() first.')
-        async with self._engine.begin() as connection:
+        async with self._begin(engine=self._engine) as connection:
             yield connection
 
+    # NOTE(krishan711): replicas are chosen round-robin. If there are no replicas this is the same as create_transaction().
+    @contextlib.asynccontextmanager
+    async def create_read_transaction(self) -> AsyncIterator[DatabaseConnection]:
+        async with self._begin(engine=self._get_read_engine()) as connection:
+            yield connection
+
+    # NOTE(krishan711): the whole transaction is rolled back before it is retried so function runs again from scratch. It must
+    # not have side effects outside the database (e.g. sending messages or calling apis) as those would be repeated. Errors
+    # once the commit has started are never retried as the commit may have gone through (e.g. a disconnect during COMMIT).
+    async def run_transaction[ReturnType](self, function: Callable[[DatabaseConnection], Awaitable[ReturnType]], retryConfig: DatabaseRetryConfig | None = None) -> ReturnType:
+        retryConfig = retryConfig or self.retryConfig
+        attemptCount = 0
+        while True:
+            attemptCount += 1
+            hasStartedCommit = False
+            try:
+                async with self.create_transaction() as connection:
+                    result = await function(connection)
+                    hasStartedCommit = True
+            except Exception as exception:
+                if hasStartedCommit or attemptCount >= retryConfig.maxAttemptCount or not self.is_transient_error(exception=exception):
+                    raise
+                backoffSeconds = self._get_retry_backoff_seconds(retryConfig=retryConfig, attemptCount=attemptCount)
+                logging.info(f'Retrying database transaction in {backoffSeconds:.3f}s after transient error: {exception!s}')
+                logging.stat(name='database_transaction_retry', key=type(exception).__name__)
+                await asyncio.sleep(backoffSeconds)
+            else:
+                return result
+
     def _get_context_connection(self) -> DatabaseConnection | None:
         try:
             connection = self._connectionContext.get()
@@ -70,10 +366,14 @@ class Database:
 
     # NOTE(krishan711): this is a little confusing. We creaete a connection for each erquest
     # but if anything inside that request wants to do parallel queries, they should create
-    # their own transaction using `self.database.create_transaction()`, because asyncpg (and psql)
+    # their own transaction using `self.database.create_transaction()` (or use `self.database.gather_queries()`), because asyncpg (and psql)
     # do not support parallel queries on the same connection. This shows up badly if there is an
     # uncaught exception raised whilst parallel queries are running.
-    # We have the forced reconnect at the bottom just to catch for this wierd case.
+    # We have the invalidation at the bottom just to catch for this wierd case.
+    @staticmethod
+    def _is_concurrent_operation_error(exception: BaseException) -> bool:
+        return isinstance(exception, sqlalchemy.exc.InterfaceError) and 'cannot perform operation: another operation is in progress' in str(exception)
+
     @contextlib.asynccontextmanager
     async def create_context_connection(self) -> AsyncIterator[DatabaseConnection]:
         if not self._engine:
@@ -82,24 +382,102 @@ class Database:
             raise InternalServerErrorException(message='Connection has already been established in this context.')
         connection = None
         try:
-            async with self._engine.begin() as connection:
+            async with self._begin(engine=self._engine) as connection, contextlib.AsyncExitStack() as readExitStack:
                 self._connectionContext.set(connection)
+                self._readStateContext.set(_ContextReadState(exitStack=readExitStack))
                 try:
                     yield connection
+                except sqlalchemy.exc.InterfaceError as exception:
+                    # NOTE(krishan711): only this connection is in a broken state so it is dropped from the pool rather than
+                    # resetting the whole engine (which would break every other request using it)
+                    if self._is_concurrent_operation_error(exception=exception) and not connection.invalidated:
+                        await connection.invalidate(exception=exception)
+                    raise
                 finally:
                     self._connectionContext.set(None)
+                    self._readStateContext.set(None)
         except sqlalchemy.exc.InterfaceError as exception:
-            if 'cannot perform operation: another operation is in progress' not in str(exception):
+            if not self._is_concurrent_operation_error(exception=exception):
                 raise
-            logging.error(f'Database connection error (likely concurrent operations): {exception}. Forcing reconnect. You MUST ensure that you are not running parallel queries on the same connection.')
-            await self.disconnect()
-            await self.connect()
+            logging.error(f'Database connection error (likely concurrent operations): {exception}. Invalidated the connection. You MUST ensure that you are not running parallel queries on the same connection.')
+
+    def _get_context_read_state(self) -> _ContextReadState | None:
+        try:
+            return self._readStateContext.get()
+        except LookupError:
+            pass
+        return None
+
+    @staticmethod
+    def _is_read_query(query: TypedReturnsRows[ResultType]) -> bool:
+        if isinstance(query, Select):
+            return query._for_update_arg is None  # noqa: SLF001
+        return isinstance(query, CompoundSelect)
+
+    # NOTE(krishan711): reads in a context go to a replica connection which is opened lazily and closed with the context
+    # connection. Once anything has been written in the context, reads go to the primary if shouldReadYourWrites is set.
+    async def _get_context_read_connection(self) -> DatabaseConnection | None:
+        if not self._replicaEngines:
+            return None
+        readState = self._get_context_read_state()
+        if readState is None or (self.shouldReadYourWrites and readState.hasWritten):
+            return None
+        if readState.connection is None or readState.connection.closed:
+            readState.connection = await readState.exitStack.enter_async_context(self._begin(engine=self._get_read_engine()))
+        return readState.connection
 
-    async def execute(self, query: TypedReturnsRows[ResultType], connection: DatabaseConnection | None = None) -> Result[ResultType]:
+    def _record_context_write(self) -> None:
+        readState = self._get_context_read_state()
+        if readState is not None:
+            readState.hasWritten = True
+
+    def has_context_writes(self) -> bool:
+        readState = self._get_context_read_state()
+        return readState is not None and readState.hasWritten
+
+    async def execute(self, query: TypedReturnsRows[ResultType], connection: DatabaseConnection | None = None, parameters: Mapping[str, Any] | Sequence[Mapping[str, Any]] | None = None) -> Result[ResultType]:  # type: ignore[explicit-any]
         if not self._engine:
             raise InternalServerErrorException(message='Connection has not been established. Please called collect() first.')
+        isReadQuery = self._is_read_query(query=query)
+        if not isReadQuery:
+            self._record_context_write()
+        if not connection and isReadQuery:
+            connection = await self._get_context_read_connection()
         if not connection:
             connection = self._get_context_connection()
         if not connection:
             raise InternalServerErrorException(message='No connection found. Please provide a connection or call create_context_connection() for the context.')
-        return typing.cast(Result[ResultType], await connection.execute(statement=query))
+        return typing.cast(Result[ResultType], await connection.execute(statement=query, parameters=parameters))
+
+    # NOTE(krishan711): this is the safe way to run queries in parallel inside a context (see the note on create_context_connection).
+    # Each awaitable runs in its own task with its own pooled read connection set as the context connection, so anything that
+    # uses the context connection (e.g. retriever calls without a connection) works unchanged. As they are separate connections
+    # they only see committed data, not uncommitted writes made on the context connection.
+    async def gather_queries[QueryReturnType](self, *awaitables: Awaitable[QueryReturnType], maxConcurrency: int = 10) -> list[QueryReturnType]:
+        semaphore = asyncio.Semaphore(maxConcurrency)
+
+        async def run_with_connection(awaitable: Awaitable[QueryReturnType]) -> QueryReturnType:
+            async with semaphore, self.create_read_transaction() as connection:
+                self._connectionContext.set(connection)
+                self._readStateContext.set(None)
+                return await awaitable
+
+        return list(await asyncio.gather(*[run_with_connection(awaitable=awaitable) for awaitable in awaitables]))
+
+    # NOTE(krishan711): this uses a server-side cursor so only batchSize rows are held in memory at a time. If there
+    # is no connection for the context (e.g. in streamed endpoints) a transaction is held open until the stream is finished.
+    async def stream(self, query: TypedReturnsRows[ResultType], connection: DatabaseConnection | None = None, batchSize: int = 1000) -> AsyncIterator[Sequence[Row[ResultType]]]:
+        if not self._engine:
+            raise InternalServerErrorException(message='Connection has not been established. Please called collect() first.')
+        if not connection and self._is_read_query(query=query):
+            connection = await self._get_context_read_connection()
+        if not connection:
+            connection = self._get_context_connection()
+        if not connection:
+            async with self.create_read_transaction() if self._is_read_query(query=query) else self.create_transaction() as newConnection:
+                async for rows in self.stream(query=query, connection=newConnection, batchSize=batchSize):
+                    yield rows
+            return
+        result = await connection.stream(statement=query)
+        async for rows in result.partitions(size=batchSize):
+            yield rows
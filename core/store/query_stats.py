@@ -0,0 +1,81 @@
+import dataclasses
+import hashlib
+import re
+
+from core import logging
+
+_WHITESPACE_REGEX = re.compile(r'\s+')
+_STRING_LITERAL_REGEX = re.compile(r"'(?:[^']|'')*'")
+_NUMERIC_LITERAL_REGEX = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAMETER_REGEX = re.compile(r'\$\d+|%\([^)]+\)s|(?<![:\w]):[a-zA-Z_]\w*|\?')
+_PARAMETER_LIST_REGEX = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_REPEATED_PARAMETER_LIST_REGEX = re.compile(r'\(\?, \.\.\.\)(?:, \(\?, \.\.\.\))+')
+
+
+@dataclasses.dataclass
+class QueryStats:
+    fingerprintId: str
+    fingerprint: str
+    count: int = 0
+    totalSeconds: float = 0
+    maxSeconds: float = 0
+    totalRowCount: int = 0
+
+
+class QueryStatsRecorder:
+    def __init__(self, slowQueryThresholdSeconds: float | None = 1.0, maxFingerprintCount: int = 1000) -> None:
+        self.slowQueryThresholdSeconds = slowQueryThresholdSeconds
+        self.maxFingerprintCount = maxFingerprintCount
+        self._fingerprintCache: dict[str, QueryStats] = {}
+        self._fingerprintQueryStats: dict[str, QueryStats] = {}
+
+    @staticmethod
+    def create_fingerprint(statement: str) -> str:
+        fingerprint = _WHITESPACE_REGEX.sub(' ', statement).strip()
+        fingerprint = _STRING_LITERAL_REGEX.sub('?', fingerprint)
+        fingerprint = _PARAMETER_REGEX.sub('?', fingerprint)
+        fingerprint = _NUMERIC_LITERAL_REGEX.sub('?', fingerprint)
+        # NOTE(krishan711): IN lists and multi-row VALUES have one parameter per item so they are collapsed to keep one fingerprint per query shape
+        fingerprint = _PARAMETER_LIST_REGEX.sub('(?, ...)', fingerprint)
+        return _REPEATED_PARAMETER_LIST_REGEX.sub('(?, ...)', fingerprint)
+
+    def _get_query_stats(self, statement: str) -> QueryStats:
+        # NOTE(krishan711): statements come from sqlalchemy's compiled cache so there are few distinct strings and they are cached to skip the regexes
+        queryStats = self._fingerprintCache.get(statement)
+        if queryStats is not None:
+            return queryStats
+        fingerprint = self.create_fingerprint(statement=statement)
+        queryStats = self._fingerprintQueryStats.get(fingerprint)
+        if queryStats is None:
+            if len(self._fingerprintQueryStats) >= self.maxFingerprintCount:
+                cheapestQueryStats = min(self._fingerprintQueryStats.values(), key=lambda queryStats: queryStats.totalSeconds)
+                del self._fingerprintQueryStats[cheapestQueryStats.fingerprint]
+                self._fingerprintCache = {cachedStatement: cachedQueryStats for cachedStatement, cachedQueryStats in self._fingerprintCache.items() if cachedQueryStats is not cheapestQueryStats}
+            fingerprintId = hashlib.md5(fingerprint.encode(), usedforsecurity=False).hexdigest()[:12]
+            queryStats = QueryStats(fingerprintId=fingerprintId, fingerprint=fingerprint)
+            self._fingerprintQueryStats[fingerprint] = queryStats
+        if len(self._fingerprintCache) < self.maxFingerprintCount * 10:
+            self._fingerprintCache[statement] = queryStats
+        return queryStats
+
+    def record_query(self, statement: str, durationSeconds: float, rowCount: int | None) -> None:
+        queryStats = self._get_query_stats(statement=statement)
+        queryStats.count += 1
+        queryStats.totalSeconds += durationSeconds
+        queryStats.maxSeconds = max(queryStats.maxSeconds, durationSeconds)
+        if rowCount is not None and rowCount >= 0:
+            queryStats.totalRowCount += rowCount
+        logging.stat(name='database_query_seconds', key=queryStats.fingerprintId, value=durationSeconds)
+        if self.slowQueryThresholdSeconds is not None and durationSeconds >= self.slowQueryThresholdSeconds:
+            logging.warning(f'Slow database query ({durationSeconds:.3f}s, {rowCount} rows) [{queryStats.fingerprintId}]: {queryStats.fingerprint}')
+
+    def get_top_query_stats(self, count: int = 20) -> list[QueryStats]:
+        return sorted(self._fingerprintQueryStats.values(), key=lambda queryStats: queryStats.totalSeconds, reverse=True)[:count]
+
+    def log_top_query_stats(self, count: int = 20) -> None:
+        for queryStats in self.get_top_query_stats(count=count):
+            logging.info(f'Database query [{queryStats.fingerprintId}] count={queryStats.count} totalSeconds={queryStats.totalSeconds:.3f} maxSeconds={queryStats.maxSeconds:.3f} rows={queryStats.totalRowCount}: {queryStats.fingerprint}')
+
+    def reset(self) -> None:
+        self._fingerprintCache = {}
+        self._fingerprintQueryStats = {}
@@ -0,0 +1,107 @@
+import asyncio
+import contextlib
+import contextvars
+import dataclasses
+from collections.abc import AsyncIterator
+from collections.abc import Hashable
+from collections.abc import Sequence
+
+import sqlalchemy
+from sqlalchemy import Table
+from sqlalchemy.engine import Row
+
+from core.exceptions import InternalServerErrorException
+from core.store.database import Database
+from core.store.retriever import LARGE_VALUE_LIST_SIZE
+from core.store.retriever import create_contained_in_clause
+from core.store.retriever import create_value_list_parameter
+from core.util import list_util
+
+RecordLoaderKey = tuple[Table, str]
+LoadedRow = Row[tuple]  # type: ignore[type-arg]
+
+
+@dataclasses.dataclass
+class _RecordLoaderState:
+    loadedRows: dict[RecordLoaderKey, dict[Hashable, LoadedRow | None]] = dataclasses.field(default_factory=dict)
+    pendingFutures: dict[RecordLoaderKey, dict[Hashable, asyncio.Future[LoadedRow | None]]] = dataclasses.field(default_factory=dict)
+    loadTasks: set[asyncio.Task[None]] = dataclasses.field(default_factory=set)
+    queryLock: asyncio.Lock = dataclasses.field(default_factory=asyncio.Lock)
+
+
+# NOTE(krishan711): this collects every value requested for a (table, field) within one event loop tick and fetches them
+# with a single IN query. Loaded rows are cached until the context ends so later loads of the same value don't query again.
+# It is meant for unique fields (e.g. ids), if more than one row matches a value the last one is returned.
+class RecordLoader:
+    def __init__(self, database: Database, maxBatchSize: int = 1000) -> None:
+        self.database = database
+        self.maxBatchSize = maxBatchSize
+        self._stateContext = contextvars.ContextVar[_RecordLoaderState | None]('_stateContext')
+        self._dialectName = database.get_dialect_name()
+
+    @contextlib.asynccontextmanager
+    async def create_context(self) -> AsyncIterator[None]:
+        if self._get_state() is not None:
+            raise InternalServerErrorException(message='RecordLoader context has already been created in this context.')
+        self._stateContext.set(_RecordLoaderState())
+        try:
+            yield
+        finally:
+            self._stateContext.set(None)
+
+    def _get_state(self) -> _RecordLoaderState | None:
+        try:
+            return self._stateContext.get()
+        except LookupError:
+            pass
+        return None
+
+    async def _load_pending(self, state: _RecordLoaderState, key: RecordLoaderKey) -> None:
+        pendingFutures = state.pendingFutures.pop(key, {})
+        loadedRows = state.loadedRows.setdefault(key, {})
+        table, fieldName = key
+        field = table.c[fieldName]
+        try:
+            for values in list_util.generate_chunks(lst=list(pendingFutures.keys()), chunkSize=self.maxBatchSize):
+                isLargeList = len(values) > LARGE_VALUE_LIST_SIZE
+                parameter = create_value_list_parameter(field=field, dialectName=self._dialectName, isLargeList=isLargeList, values=values)
+                query = sqlalchemy.select(table).where(create_contained_in_clause(field=field, parameter=parameter, dialectName=self._dialectName, isNegated=False, isLargeList=isLargeList))
+                # NOTE(krishan711): loads for different (table, field)s run as separate tasks but share the context connection, which can only run one query at a time
+                async with state.queryLock:
+                    result = await self.database.execute(query=query)
+                for value in values:
+                    loadedRows[value] = None
+                for row in result:
+                    loadedRows[row._mapping[field]] = row  # noqa: SLF001
+        except Exception as exception:  # noqa: BLE001
+            for future in pendingFutures.values():
+                if not future.done():
+                    future.set_exception(exception)
+            return
+        for value, future in pendingFutures.items():
+            if not future.done():
+                future.set_result(loadedRows.get(value))
+
+    async def load(self, table: Table, fieldName: str, value: Hashable) -> LoadedRow | None:
+        state = self._get_state()
+        if state is None:
+            raise InternalServerErrorException(message='No RecordLoader context found. Please call create_context() first.')
+        key = (table, fieldName)
+        loadedRows = state.loadedRows.get(key)
+        if loadedRows is not None and value in loadedRows:
+            return loadedRows[value]
+        pendingFutures = state.pendingFutures.setdefault(key, {})
+        future = pendingFutures.get(value)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            pendingFutures[value] = future
+            if len(pendingFutures) == 1:
+                # NOTE(krishan711): the task only starts after everything already scheduled has run, which is what lets a batch build up
+                loadTask = asyncio.create_task(self._load_pending(state=state, key=key))
+                state.loadTasks.add(loadTask)
+                loadTask.add_done_callback(state.loadTasks.discard)
+        # NOTE(krishan711): shielded so one caller being cancelled doesn't cancel the load for the others waiting on the same value
+        return await asyncio.shield(future)
+
+    async def load_many(self, table: Table, fieldName: str, values: Sequence[Hashable]) -> list[LoadedRow | None]:
+        return list(await asyncio.gather(*[self.load(table=table, fieldName=fieldName, value=value) for value in values]))
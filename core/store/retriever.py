@@ -1,14 +1,29 @@
+import base64
 import dataclasses
 import datetime
+import typing
+from collections.abc import AsyncIterator
+from collections.abc import Callable
 from collections.abc import Sequence
 from enum import Enum
+from typing import Any
 
 import sqlalchemy
 from sqlalchemy import Table
+from sqlalchemy.dialects import postgresql as sqlalchemy_psql
+from sqlalchemy.engine import Row
+from sqlalchemy.sql import ColumnElement
 from sqlalchemy.sql import Select
 
+from core.exceptions import BadRequestException
+from core.exceptions import InternalServerErrorException
 from core.store.database import Database
+from core.store.database import DatabaseConnection
 from core.store.database import ResultType
+from core.store.row_cache import RowCache
+from core.store.row_mapper import RowMapper
+from core.util import date_util
+from core.util import json_util
 
 
 class Direction(Enum):
@@ -27,6 +42,21 @@ class RandomOrder(Order):
     fieldName: str = '__KIBA_RANDOM'
 
 
+class AggregateFunction(Enum):
+    COUNT = 'count'
+    MIN = 'min'
+    MAX = 'max'
+    SUM = 'sum'
+    AVERAGE = 'average'
+
+
+@dataclasses.dataclass
+class FieldAggregate:
+    function: AggregateFunction
+    # NOTE(krishan711): fieldName can only be left out for COUNT, which then counts rows
+    fieldName: str | None = None
+
+
 @dataclasses.dataclass
 class FieldFilter:
     fieldName: str
@@ -84,9 +114,55 @@ class BooleanFieldFilter(FieldFilter):
     ne: bool | None = None
 
 
+QueryParameters = dict[str, object]
+FieldFilterShape = tuple[type[FieldFilter], str, bool, bool, tuple[tuple[str, bool], ...]]
+OrderShape = tuple[type[Order], str, Direction]
+ListQueryShape = tuple[Table, tuple[FieldFilterShape, ...], tuple[OrderShape, ...], bool, bool]
+
+_FIELD_FILTER_OPERATORS: dict[str, Callable[[ColumnElement[object], ColumnElement[object]], ColumnElement[bool]]] = {
+    'eq': lambda field, value: field == value,
+    'ne': lambda field, value: field != value,
+    'lte': lambda field, value: field <= value,
+    'lt': lambda field, value: field < value,
+    'gte': lambda field, value: field >= value,
+    'gt': lambda field, value: field > value,
+}
+_VALUE_LIST_FIELD_FILTER_OPERATORS = {'containedIn': False, 'notContainedIn': True}
+_LIST_QUERY_CACHE_SIZE = 1000
+# NOTE(krishan711): value lists longer than this are no longer bound as one parameter per value (see create_value_list_parameter)
+LARGE_VALUE_LIST_SIZE = 1000
+
+
+# NOTE(krishan711): on postgres the whole list is bound as a single array parameter so the statement (and asyncpg's prepared
+# statement) is the same for any number of values, and large lists are unnested into a subquery so the planner can join
+# against them. Other dialects bind one parameter per value which hits their parameter limits (32766 on sqlite) so large
+# lists are rendered inline instead.
+def create_value_list_parameter(field: ColumnElement[object], dialectName: str, isLargeList: bool, key: str | None = None, values: Sequence[object] | None = None) -> sqlalchemy.BindParameter[Any]:  # type: ignore[explicit-any]
+    if dialectName == 'postgresql':
+        if values is None:
+            return sqlalchemy.bindparam(key=key, type_=sqlalchemy_psql.ARRAY(field.type))
+        return sqlalchemy.bindparam(key=key, value=list(values), type_=sqlalchemy_psql.ARRAY(field.type))
+    if values is None:
+        return sqlalchemy.bindparam(key=key, type_=field.type, expanding=True, literal_execute=isLargeList)
+    return sqlalchemy.bindparam(key=key, value=list(values), type_=field.type, expanding=True, literal_execute=isLargeList)
+
+
+def create_contained_in_clause(field: ColumnElement[object], parameter: sqlalchemy.BindParameter[Any], dialectName: str, isNegated: bool, isLargeList: bool) -> ColumnElement[bool]:  # type: ignore[explicit-any]
+    if dialectName == 'postgresql':
+        if isLargeList:
+            subquery = sqlalchemy.select(sqlalchemy.func.unnest(parameter)).scalar_subquery()
+            return field.not_in(subquery) if isNegated else field.in_(subquery)
+        return field != sqlalchemy.all_(parameter) if isNegated else field == sqlalchemy.any_(parameter)
+    return field.not_in(parameter) if isNegated else field.in_(parameter)
+
+
 class Retriever:
-    def __init__(self, database: Database) -> None:
+    def __init__(self, database: Database, rowCache: RowCache | None = None) -> None:
         self.database = database
+        self.rowCache = rowCache
+        self._listQueryCache: dict[ListQueryShape, Select[tuple]] = {}  # type: ignore[type-arg]
+        self._rowMappers: dict[tuple[Table, type], RowMapper[object]] = {}
+        self._dialectName = database.get_dialect_name()
 
     def _apply_order(self, query: Select[ResultType], table: Table, order: Order) -> Select[ResultType]:
         if isinstance(order, RandomOrder):
@@ -101,6 +177,11 @@ class Retriever:
             query = self._apply_order(query=query, table=table, order=order)
         return query
 
+    def _create_contained_in_clause(self, field: ColumnElement[object], values: Sequence[object], isNegated: bool) -> ColumnElement[bool]:
+        isLargeList = len(values) > LARGE_VALUE_LIST_SIZE
+        parameter = create_value_list_parameter(field=field, dialectName=self._dialectName, isLargeList=isLargeList, values=values)
+        return create_contained_in_clause(field=field, parameter=parameter, dialectName=self._dialectName, isNegated=isNegated, isLargeList=isLargeList)
+
     def _apply_string_field_filter(self, query: Select[ResultType], table: Table, fieldFilter: StringFieldFilter) -> Select[ResultType]:
         field = table.c[fieldFilter.fieldName]
         if fieldFilter.eq is not None:
@@ -108,9 +189,9 @@ class Retriever:
         if fieldFilter.ne is not None:
             query = query.where(field != fieldFilter.ne)
         if fieldFilter.containedIn is not None:
-            query = query.where(field.in_(fieldFilter.containedIn))
+            query = query.where(self._create_contained_in_clause(field=field, values=fieldFilter.containedIn, isNegated=False))
         if fieldFilter.notContainedIn is not None:
-            query = query.where(field.not_in(fieldFilter.notContainedIn))
+            query = query.where(self._create_contained_in_clause(field=field, values=fieldFilter.notContainedIn, isNegated=True))
         return query
 
     def _apply_date_field_filter(self, query: Select[ResultType], table: Table, fieldFilter: DateFieldFilter) -> Select[ResultType]:
@@ -128,9 +209,9 @@ class Retriever:
         if fieldFilter.gt is not None:
             query = query.where(field > fieldFilter.gt)
         if fieldFilter.containedIn is not None:
-            query = query.where(field.in_(fieldFilter.containedIn))
+            query = query.where(self._create_contained_in_clause(field=field, values=fieldFilter.containedIn, isNegated=False))
         if fieldFilter.notContainedIn is not None:
-            query = query.where(field.not_in(fieldFilter.notContainedIn))
+            query = query.where(self._create_contained_in_clause(field=field, values=fieldFilter.notContainedIn, isNegated=True))
         return query
 
     def _apply_integer_field_filter(self, query: Select[ResultType], table: Table, fieldFilter: IntegerFieldFilter) -> Select[ResultType]:
@@ -148,9 +229,9 @@ class Retriever:
         if fieldFilter.gt is not None:
             query = query.where(field > fieldFilter.gt)
         if fieldFilter.containedIn is not None:
-            query = query.where(field.in_(fieldFilter.containedIn))
+            query = query.where(self._create_contained_in_clause(field=field, values=fieldFilter.containedIn, isNegated=False))
         if fieldFilter.notContainedIn is not None:
-            query = query.where(field.not_in(fieldFilter.notContainedIn))
+            query = query.where(self._create_contained_in_clause(field=field, values=fieldFilter.notContainedIn, isNegated=True))
         return query
 
     def _apply_float_field_filter(self, query: Select[ResultType], table: Table, fieldFilter: FloatFieldFilter) -> Select[ResultType]:
@@ -168,9 +249,9 @@ class Retriever:
         if fieldFilter.gt is not None:
             query = query.where(field > fieldFilter.gt)
         if fieldFilter.containedIn is not None:
-            query = query.where(field.in_(fieldFilter.containedIn))
+            query = query.where(self._create_contained_in_clause(field=field, values=fieldFilter.containedIn, isNegated=False))
         if fieldFilter.notContainedIn is not None:
-            query = query.where(field.not_in(fieldFilter.notContainedIn))
+            query = query.where(self._create_contained_in_clause(field=field, values=fieldFilter.notContainedIn, isNegated=True))
         return query
 
     def _apply_boolean_field_filter(self, query: Select[ResultType], table: Table, fieldFilter: BooleanFieldFilter) -> Select[ResultType]:
@@ -203,3 +284,210 @@ class Retriever:
         for fieldFilter in fieldFilters:
             query = self._apply_field_filter(query=query, table=table, fieldFilter=fieldFilter)
         return query
+
+    def _get_aggregate_column(self, table: Table, aggregate: FieldAggregate) -> ColumnElement[int] | ColumnElement[object]:
+        if aggregate.fieldName is None:
+            if aggregate.function != AggregateFunction.COUNT:
+                raise InternalServerErrorException(message=f'A fieldName is required for {aggregate.function.value} aggregates')
+            return sqlalchemy.func.count()
+        field = table.c[aggregate.fieldName]
+        if aggregate.function == AggregateFunction.COUNT:
+            return sqlalchemy.func.count(field)
+        if aggregate.function == AggregateFunction.MIN:
+            return sqlalchemy.func.min(field)
+        if aggregate.function == AggregateFunction.MAX:
+            return sqlalchemy.func.max(field)
+        if aggregate.function == AggregateFunction.SUM:
+            return sqlalchemy.func.sum(field)
+        return sqlalchemy.func.avg(field)
+
+    async def _count_records(self, table: Table, fieldFilters: Sequence[FieldFilter] | None = None, connection: DatabaseConnection | None = None) -> int:
+        return int(typing.cast(int, await self._get_aggregate(table=table, aggregate=FieldAggregate(function=AggregateFunction.COUNT), fieldFilters=fieldFilters, connection=connection)))
+
+    async def _has_records(self, table: Table, fieldFilters: Sequence[FieldFilter] | None = None, connection: DatabaseConnection | None = None) -> bool:
+        subquery = sqlalchemy.select(sqlalchemy.literal(1)).select_from(table)
+        if fieldFilters:
+            subquery = self._apply_field_filters(query=subquery, table=table, fieldFilters=fieldFilters)
+        query = sqlalchemy.select(subquery.exists())
+        result = await self.database.execute(query=query, connection=connection)
+        return bool(result.scalar_one())
+
+    async def _get_aggregate(self, table: Table, aggregate: FieldAggregate, fieldFilters: Sequence[FieldFilter] | None = None, connection: DatabaseConnection | None = None) -> object:
+        query = sqlalchemy.select(self._get_aggregate_column(table=table, aggregate=aggregate)).select_from(table)
+        if fieldFilters:
+            query = self._apply_field_filters(query=query, table=table, fieldFilters=fieldFilters)
+        result = await self.database.execute(query=query, connection=connection)
+        return result.scalar_one()
+
+    async def _get_grouped_aggregates(
+        self,
+        table: Table,
+        groupFieldNames: Sequence[str],
+        aggregate: FieldAggregate,
+        fieldFilters: Sequence[FieldFilter] | None = None,
+        connection: DatabaseConnection | None = None,
+    ) -> dict[tuple[object, ...], object]:
+        groupFields = [table.c[groupFieldName] for groupFieldName in groupFieldNames]
+        query = sqlalchemy.select(*groupFields, self._get_aggregate_column(table=table, aggregate=aggregate)).select_from(table)
+        if fieldFilters:
+            query = self._apply_field_filters(query=query, table=table, fieldFilters=fieldFilters)
+        query = query.group_by(*groupFields)
+        result = await self.database.execute(query=query, connection=connection)
+        return {tuple(row[:-1]): row[-1] for row in result}
+
+    # NOTE(krishan711): the mapper expects rows with the table's columns in order, i.e. from select(table)
+    def _get_row_mapper[RecordType](self, table: Table, recordType: type[RecordType]) -> RowMapper[RecordType]:
+        rowMapper = self._rowMappers.get((table, recordType))
+        if rowMapper is None:
+            rowMapper = RowMapper(columnKeys=[column.key for column in table.columns], recordType=recordType)
+            self._rowMappers[(table, recordType)] = rowMapper
+        return typing.cast(RowMapper[RecordType], rowMapper)
+
+    # NOTE(krishan711): with a rowCache this reads through it. Reads on a given connection or after writes in the context
+    # connection skip the cache as they must see their own uncommitted writes (which are only invalidated once committed).
+    async def _get_record_by_id[RecordType](self, table: Table, rowId: int, recordType: type[RecordType], connection: DatabaseConnection | None = None) -> RecordType | None:
+        rowMapper = self._get_row_mapper(table=table, recordType=recordType)
+        rowCache = self.rowCache if not connection and not self.database.has_context_writes() else None
+        if rowCache:
+            cachedValues = await rowCache.get_row(table=table, rowId=rowId)
+            if cachedValues is not None:
+                return rowMapper.map_row(row=cachedValues)
+        result = await self.database.execute(query=sqlalchemy.select(table).where(table.c.id == rowId), connection=connection)
+        row = result.first()
+        if row is None:
+            return None
+        if rowCache:
+            await rowCache.set_row(table=table, rowId=rowId, values=row)
+        return rowMapper.map_row(row=row)
+
+    def _create_list_query(self, table: Table, fieldFilterShapes: Sequence[FieldFilterShape], orders: Sequence[Order], hasLimit: bool, hasOffset: bool) -> Select[tuple]:  # type: ignore[type-arg]
+        query = sqlalchemy.select(table)
+        for index, (_, fieldName, isNull, isNotNull, operatorShapes) in enumerate(fieldFilterShapes):
+            field = table.c[fieldName]
+            if isNull:
+                query = query.where(field.is_(None))
+            if isNotNull:
+                query = query.where(field.is_not(None))
+            for operatorName, isLargeList in operatorShapes:
+                parameterKey = f'kiba_filter_{index}_{operatorName}'
+                if operatorName in _VALUE_LIST_FIELD_FILTER_OPERATORS:
+                    parameter = create_value_list_parameter(field=field, dialectName=self._dialectName, isLargeList=isLargeList, key=parameterKey)
+                    query = query.where(create_contained_in_clause(field=field, parameter=parameter, dialectName=self._dialectName, isNegated=_VALUE_LIST_FIELD_FILTER_OPERATORS[operatorName], isLargeList=isLargeList))
+                else:
+                    query = query.where(_FIELD_FILTER_OPERATORS[operatorName](field, sqlalchemy.bindparam(key=parameterKey, type_=field.type)))
+        query = self._apply_orders(query=query, table=table, orders=orders)
+        if hasLimit:
+            query = query.limit(sqlalchemy.bindparam(key='kiba_limit', type_=sqlalchemy.Integer))
+        if hasOffset:
+            query = query.offset(sqlalchemy.bindparam(key='kiba_offset', type_=sqlalchemy.Integer))
+        return query
+
+    # NOTE(krishan711): the returned query is shared between all calls with the same shape (table, set filter operators
+    # and orders) so it is only built once and sqlalchemy can reuse its cache key. The values are returned separately
+    # and must be passed as the parameters when executing it.
+    def _build_list_query(
+        self,
+        table: Table,
+        fieldFilters: Sequence[FieldFilter] | None = None,
+        orders: Sequence[Order] | None = None,
+        limit: int | None = None,
+        offset: int | None = None,
+    ) -> tuple[Select[tuple], QueryParameters]:  # type: ignore[type-arg]
+        parameters: QueryParameters = {}
+        fieldFilterShapes: list[FieldFilterShape] = []
+        for index, fieldFilter in enumerate(fieldFilters or []):
+            operatorShapes: list[tuple[str, bool]] = []
+            for operatorName in _FIELD_FILTER_OPERATORS:
+                value = getattr(fieldFilter, operatorName, None)
+                if value is not None:
+                    operatorShapes.append((operatorName, False))
+                    parameters[f'kiba_filter_{index}_{operatorName}'] = value
+            for operatorName in _VALUE_LIST_FIELD_FILTER_OPERATORS:
+                values = getattr(fieldFilter, operatorName, None)
+                if values is not None:
+                    operatorShapes.append((operatorName, len(values) > LARGE_VALUE_LIST_SIZE))
+                    parameters[f'kiba_filter_{index}_{operatorName}'] = list(values)
+            fieldFilterShapes.append((type(fieldFilter), fieldFilter.fieldName, bool(fieldFilter.isNull), bool(fieldFilter.isNotNull), tuple(operatorShapes)))
+        if limit is not None:
+            parameters['kiba_limit'] = limit
+        if offset is not None:
+            parameters['kiba_offset'] = offset
+        orders = orders or []
+        orderShapes = tuple((type(order), order.fieldName, order.direction) for order in orders)
+        shape: ListQueryShape = (table, tuple(fieldFilterShapes), orderShapes, limit is not None, offset is not None)
+        query = self._listQueryCache.get(shape)
+        if query is None:
+            query = self._create_list_query(table=table, fieldFilterShapes=fieldFilterShapes, orders=orders, hasLimit=limit is not None, hasOffset=offset is not None)
+            if len(self._listQueryCache) >= _LIST_QUERY_CACHE_SIZE:
+                del self._listQueryCache[next(iter(self._listQueryCache))]
+            self._listQueryCache[shape] = query
+        return query, parameters
+
+    def _get_keyset_orders(self, orders: Sequence[Order]) -> list[Order]:
+        if any(isinstance(order, RandomOrder) for order in orders):
+            raise InternalServerErrorException(message='RandomOrder cannot be used with keyset pagination')
+        if any(order.fieldName == 'id' for order in orders):
+            return list(orders)
+        # NOTE(krishan711): id is added as the last order so rows with equal sort values still have a stable position
+        return [*orders, Order(fieldName='id', direction=orders[-1].direction if orders else Direction.DESCENDING)]
+
+    def _create_keyset_cursor(self, row: Row[ResultType], table: Table, orders: Sequence[Order]) -> str:
+        keysetOrders = self._get_keyset_orders(orders=orders)
+        values = [row._mapping[table.c[order.fieldName]] for order in keysetOrders]  # noqa: SLF001
+        cursorDict = {
+            'fieldNames': [order.fieldName for order in keysetOrders],
+            'values': [date_util.datetime_to_string(dt=value) if isinstance(value, datetime.datetime) else value for value in values],
+        }
+        return base64.urlsafe_b64encode(json_util.dumpb(cursorDict)).decode()
+
+    def _parse_keyset_cursor(self, cursor: str, table: Table, keysetOrders: Sequence[Order]) -> list[object]:
+        try:
+            cursorDict = typing.cast(dict[str, list[object]], json_util.loads(base64.urlsafe_b64decode(cursor.encode())))
+            fieldNames = cursorDict['fieldNames']
+            values = cursorDict['values']
+        except (ValueError, TypeError, KeyError, json_util.JsonDecodeException) as exception:
+            raise BadRequestException(message='Invalid pagination cursor') from exception
+        if fieldNames != [order.fieldName for order in keysetOrders] or len(values) != len(keysetOrders):
+            raise BadRequestException(message='Pagination cursor does not match the requested order')
+        return [
+            date_util.datetime_from_string(dateString=value) if isinstance(value, str) and isinstance(table.c[order.fieldName].type, sqlalchemy.DateTime) else value
+            for order, value in zip(keysetOrders, values, strict=True)
+        ]
+
+    # NOTE(krishan711): the ordered fields should not be nullable as NULLs cannot be compared to seek past them
+    def _apply_keyset_pagination(self, query: Select[ResultType], table: Table, orders: Sequence[Order], cursor: str | None = None) -> Select[ResultType]:
+        keysetOrders = self._get_keyset_orders(orders=orders)
+        query = self._apply_orders(query=query, table=table, orders=keysetOrders)
+        if not cursor:
+            return query
+        values = self._parse_keyset_cursor(cursor=cursor, table=table, keysetOrders=keysetOrders)
+        fields = [table.c[order.fieldName] for order in keysetOrders]
+        directions = {order.direction for order in keysetOrders}
+        if len(directions) == 1:
+            valuesTuple = sqlalchemy.tuple_(*[sqlalchemy.literal(value, type_=field.type) for field, value in zip(fields, values, strict=True)])
+            if Direction.ASCENDING in directions:
+                return query.where(sqlalchemy.tuple_(*fields) > valuesTuple)
+            return query.where(sqlalchemy.tuple_(*fields) < valuesTuple)
+        # NOTE(krishan711): row value comparisons only work in a single direction so mixed orders need the expanded form
+        clauses = []
+        for index, order in enumerate(keysetOrders):
+            equalClauses = [field == value for field, value in zip(fields[:index], values[:index], strict=True)]
+            seekClause = fields[index] > values[index] if order.direction == Direction.ASCENDING else fields[index] < values[index]
+            clauses.append(sqlalchemy.and_(*equalClauses, seekClause))
+        return query.where(sqlalchemy.or_(*clauses))
+
+    async def _stream_records(
+        self,
+        table: Table,
+        fieldFilters: Sequence[FieldFilter] | None = None,
+        orders: Sequence[Order] | None = None,
+        connection: DatabaseConnection | None = None,
+        batchSize: int = 1000,
+    ) -> AsyncIterator[Sequence[Row[tuple]]]:  # type: ignore[type-arg]
+        query = sqlalchemy.select(table)
+        if fieldFilters:
+            query = self._apply_field_filters(query=query, table=table, fieldFilters=fieldFilters)
+        if orders:
+            query = self._apply_orders(query=query, table=table, orders=orders)
+        async for rows in self.database.stream(query=query, connection=connection, batchSize=batchSize):
+            yield rows
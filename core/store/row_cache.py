@@ -0,0 +1,80 @@
+import asyncio
+import datetime as dt
+from collections.abc import Sequence
+
+import sqlalchemy
+from sqlalchemy import Table
+
+from core import logging
+from core.caching.cache import Cache
+from core.util import json_util
+
+
+# NOTE(krishan711): rows are stored as a json list of their column values in table column order so they can be mapped
+# with the same RowMapper used for database rows. Only rows read outside of a transaction are stored and misses are not
+# cached, so inserts never need to invalidate anything. Writes invalidate the rows they touch once they have committed but
+# a read that started before the commit can still store the old row again, expirySeconds bounds how long that can last.
+class RowCache:
+    def __init__(self, cache: Cache, expirySeconds: float = 60, keyPrefix: str = 'kiba-row') -> None:
+        self.cache = cache
+        self.expirySeconds = expirySeconds
+        self.keyPrefix = keyPrefix
+
+    def _get_key(self, table: Table, rowId: int) -> str:
+        return f'{self.keyPrefix}:{table.fullname}:{rowId}'
+
+    @staticmethod
+    def _encode_row(values: Sequence[object]) -> str:
+        return json_util.dumps([value.isoformat() if isinstance(value, (dt.date, dt.time)) else value for value in values])
+
+    @staticmethod
+    def _decode_value(column: sqlalchemy.Column[object], value: object) -> object:
+        if not isinstance(value, str):
+            return value
+        if isinstance(column.type, sqlalchemy.DateTime):
+            return dt.datetime.fromisoformat(value)
+        if isinstance(column.type, sqlalchemy.Date):
+            return dt.date.fromisoformat(value)
+        if isinstance(column.type, sqlalchemy.Time):
+            return dt.time.fromisoformat(value)
+        return value
+
+    @classmethod
+    def _is_same_value(cls, value: object, otherValue: object) -> bool:
+        if type(value) is not type(otherValue):
+            return False
+        if isinstance(value, list) and isinstance(otherValue, list):
+            return len(value) == len(otherValue) and all(cls._is_same_value(value=item, otherValue=otherItem) for item, otherItem in zip(value, otherValue, strict=True))
+        if isinstance(value, dict) and isinstance(otherValue, dict):
+            return value.keys() == otherValue.keys() and all(cls._is_same_value(value=item, otherValue=otherValue[key]) for key, item in value.items())
+        return value == otherValue
+
+    def _decode_row(self, table: Table, value: str) -> list[object]:
+        values = json_util.loads(value)
+        if not isinstance(values, list) or len(values) != len(table.columns):
+            raise json_util.JsonDecodeException(message=f'Cached row does not match the columns of {table.fullname}')
+        return [self._decode_value(column=column, value=columnValue) for column, columnValue in zip(table.columns, values, strict=True)]
+
+    async def get_row(self, table: Table, rowId: int) -> list[object] | None:
+        value = await self.cache.get(key=self._get_key(table=table, rowId=rowId))
+        if value is None:
+            return None
+        try:
+            return self._decode_row(table=table, value=value)
+        except json_util.JsonDecodeException:
+            logging.warning(f'Ignoring invalid cached row for {table.fullname} {rowId}')
+        return None
+
+    async def set_row(self, table: Table, rowId: int, values: Sequence[object]) -> None:
+        # NOTE(krishan711): rows that wouldn't come back from the cache as the same types the database returned (e.g. Decimals,
+        # UUIDs or Enums) are just not cached so a read gives the same values whether or not it hits the cache
+        try:
+            value = self._encode_row(values=values)
+            if not self._is_same_value(value=list(values), otherValue=self._decode_row(table=table, value=value)):
+                return
+        except (json_util.JsonEncodeException, json_util.JsonDecodeException, ValueError):
+            return
+        await self.cache.set(key=self._get_key(table=table, rowId=rowId), value=value, expirySeconds=self.expirySeconds)
+
+    async def invalidate_rows(self, table: Table, rowIds: Sequence[int]) -> None:
+        await asyncio.gather(*[self.cache.delete(key=self._get_key(table=table, rowId=rowId)) for rowId in rowIds])
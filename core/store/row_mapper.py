@@ -0,0 +1,57 @@
+import dataclasses
+import operator
+from collections.abc import Callable
+from collections.abc import Iterable
+from collections.abc import Sequence
+
+from sqlalchemy import Table
+from sqlalchemy.engine import Result
+
+from core.exceptions import InternalServerErrorException
+
+
+class RowMapper[RecordType]:
+    # NOTE(krishan711): the column lookups are resolved once here so mapping a row is a single itemgetter call and a positional
+    # constructor call, without building an intermediate dict per row. recordType must be a dataclass (ideally with slots=True).
+    def __init__(self, columnKeys: Sequence[str], recordType: type[RecordType]) -> None:
+        if not dataclasses.is_dataclass(recordType):
+            raise InternalServerErrorException(message=f'RowMapper recordType must be a dataclass, got {recordType}')
+        self.columnKeys = list(columnKeys)
+        self.recordType = recordType
+        fieldNames = [field.name for field in dataclasses.fields(recordType) if field.init]
+        missingFieldNames = [fieldName for fieldName in fieldNames if fieldName not in self.columnKeys]
+        if missingFieldNames:
+            raise InternalServerErrorException(message=f'RowMapper could not find columns for fields {missingFieldNames} on {recordType.__name__}')
+        columnIndexes = [self.columnKeys.index(fieldName) for fieldName in fieldNames]
+        if len(columnIndexes) == 1:
+            columnIndex = columnIndexes[0]
+            self._get_values: Callable[[Sequence[object]], Sequence[object]] = lambda row: (row[columnIndex],)
+        else:
+            self._get_values = operator.itemgetter(*columnIndexes)
+
+    def map_row(self, row: Sequence[object]) -> RecordType:
+        return self.recordType(*self._get_values(row))
+
+    def map_rows(self, rows: Iterable[Sequence[object]]) -> list[RecordType]:
+        recordType = self.recordType
+        getValues = self._get_values
+        return [recordType(*getValues(row)) for row in rows]
+
+    def map_result(self, result: Result[tuple]) -> list[RecordType]:  # type: ignore[type-arg]
+        return self.map_rows(rows=result)
+
+
+def create_table_record_type(table: Table, name: str | None = None) -> type:
+    return dataclasses.make_dataclass(
+        cls_name=name or f'{table.name}_record',
+        fields=[(column.key, object) for column in table.columns],
+        slots=True,
+    )
+
+
+def get_result_columns(result: Result[tuple]) -> dict[str, list[object]]:  # type: ignore[type-arg]
+    columnKeys = list(result.keys())
+    columnValues = list(zip(*result, strict=True))
+    if not columnValues:
+        return {columnKey: [] for columnKey in columnKeys}
+    return {columnKey: list(values) for columnKey, values in zip(columnKeys, columnValues, strict=True)}
@@ -1,9 +1,18 @@
+import asyncio
 import contextlib
+import dataclasses
+from collections.abc import AsyncIterable
 from collections.abc import AsyncIterator
+from collections.abc import Mapping
+from collections.abc import Sequence
 from typing import TYPE_CHECKING
 from typing import Any
 
+import sqlalchemy
+from sqlalchemy import Column
 from sqlalchemy import Table
+from sqlalchemy.dialects import postgresql as sqlalchemy_psql
+from sqlalchemy.dialects import sqlite as sqlalchemy_sqlite
 from sqlalchemy.engine import Result
 from sqlalchemy.sql.selectable import TypedReturnsRows
 
@@ -11,6 +20,12 @@ from core.exceptions import InternalServerErrorException
 from core.store.database import Database
 from core.store.database import DatabaseConnection
 from core.store.database import ResultType
+from core.store.retriever import LARGE_VALUE_LIST_SIZE
+from core.store.retriever import create_contained_in_clause
+from core.store.retriever import create_value_list_parameter
+from core.store.row_cache import RowCache
+from core.util import async_util
+from core.util import list_util
 
 if TYPE_CHECKING:
     from sqlalchemy.sql._typing import _ColumnExpressionArgument
@@ -25,26 +40,62 @@ else:
 CreateRecordValuesDict = dict[_DMLColumnArgument, Any]  # type: ignore[explicit-any]
 UpdateRecordValuesDict = dict[_DMLColumnArgument, Any]  # type: ignore[explicit-any]
 
+# NOTE(krishan711): asyncpg allows at most 32767 parameters per statement and sqlite defaults to 32766
+MAX_QUERY_PARAMETER_COUNT = 32000
+
 
 class SavingException(InternalServerErrorException):
     pass
 
 
+@dataclasses.dataclass
+class _SaverBatchOperations:
+    insertValuesList: list[CreateRecordValuesDict] = dataclasses.field(default_factory=list)
+    insertFutures: list[asyncio.Future[int]] = dataclasses.field(default_factory=list)
+    idValuesMap: dict[int, UpdateRecordValuesDict] = dataclasses.field(default_factory=dict)
+    deleteRowIds: dict[int, None] = dataclasses.field(default_factory=dict)
+
+
 class Saver:
-    def __init__(self, database: Database) -> None:
+    def __init__(self, database: Database, rowCache: RowCache | None = None) -> None:
         self.database = database
+        self.rowCache = rowCache
 
     @contextlib.asynccontextmanager
     async def create_transaction(self) -> AsyncIterator[DatabaseConnection]:
         async with self.database.create_transaction() as connection:
             yield connection
 
-    async def _execute(self, query: TypedReturnsRows[ResultType], connection: DatabaseConnection | None = None) -> Result[ResultType]:
+    @contextlib.asynccontextmanager
+    async def batch(self, connection: DatabaseConnection | None = None, maxOperationCount: int = 1000) -> AsyncIterator['SaverBatch']:
+        if not connection:
+            async with self.create_transaction() as newConnection, self.batch(connection=newConnection, maxOperationCount=maxOperationCount) as saverBatch:
+                yield saverBatch
+            return
+        saverBatch = SaverBatch(saver=self, connection=connection, maxOperationCount=maxOperationCount)
+        try:
+            yield saverBatch
+        except BaseException:
+            saverBatch.cancel()
+            raise
+        await saverBatch.flush()
+
+    async def _invalidate_cached_rows(self, table: Table, rowIds: Sequence[int], connection: DatabaseConnection | None = None) -> None:
+        rowCache = self.rowCache
+        if not rowCache or len(rowIds) == 0:
+            return
+        # NOTE(krishan711): rows written in a transaction are invalidated after it commits so a read in between can't cache the old row again
+        if connection:
+            self.database.add_after_commit_callback(connection=connection, callback=lambda: rowCache.invalidate_rows(table=table, rowIds=rowIds))
+            return
+        await rowCache.invalidate_rows(table=table, rowIds=rowIds)
+
+    async def _execute(self, query: TypedReturnsRows[ResultType], connection: DatabaseConnection | None = None, parameters: Sequence[Mapping[str, Any]] | None = None) -> Result[ResultType]:  # type: ignore[explicit-any]
         try:
             if connection:
-                return await self.database.execute(query=query, connection=connection)
+                return await self.database.execute(query=query, connection=connection, parameters=parameters)
             async with self.create_transaction() as newConnection:
-                return await self.database.execute(query=query, connection=newConnection)
+                return await self.database.execute(query=query, connection=newConnection, parameters=parameters)
         # NOTE(krishan711): this could probs be more specific e.g. sqlalchemy.dialects.postgresql.asyncpg.IntegrityError
         except Exception as exception:
             raise SavingException(message=f'Error running save operation: {exception!s}') from exception
@@ -55,14 +106,248 @@ class Saver:
         rowId = int(result.scalar_one())
         return rowId
 
+    @staticmethod
+    def _get_query_parameters(values: CreateRecordValuesDict | UpdateRecordValuesDict) -> dict[str, Any]:  # type: ignore[explicit-any]
+        return {(key.key if isinstance(key, Column) else str(key)): value for key, value in values.items()}
+
+    @staticmethod
+    def _get_chunk_size(parametersList: Sequence[Mapping[str, Any]]) -> int:  # type: ignore[explicit-any]
+        # NOTE(krishan711): the extra parameter per row leaves room for the sentinel sqlalchemy adds to keep returned rows ordered
+        columnCount = max(len(parameters) for parameters in parametersList) + 1
+        return max(1, MAX_QUERY_PARAMETER_COUNT // columnCount)
+
+    @staticmethod
+    def _group_parameters_by_field_names(parametersList: Sequence[dict[str, Any]]) -> dict[tuple[str, ...], list[tuple[int, dict[str, Any]]]]:  # type: ignore[explicit-any]
+        # NOTE(krishan711): an executemany takes its columns from the first row so rows are grouped by the fields they set
+        fieldNamesIndexParametersMap: dict[tuple[str, ...], list[tuple[int, dict[str, Any]]]] = {}  # type: ignore[explicit-any]
+        for index, parameters in enumerate(parametersList):
+            fieldNamesIndexParametersMap.setdefault(tuple(sorted(parameters.keys())), []).append((index, parameters))
+        return fieldNamesIndexParametersMap
+
+    async def _insert_records(self, table: Table, valuesList: Sequence[CreateRecordValuesDict], connection: DatabaseConnection | None = None) -> list[int]:
+        if len(valuesList) == 0:
+            return []
+        if not connection:
+            async with self.create_transaction() as newConnection:
+                return await self._insert_records(table=table, valuesList=valuesList, connection=newConnection)
+        parametersList = [self._get_query_parameters(values=values) for values in valuesList]
+        query = table.insert().returning(table.c.id, sort_by_parameter_order=True)
+        rowIds: list[int] = [0] * len(parametersList)
+        for indexParametersList in self._group_parameters_by_field_names(parametersList=parametersList).values():
+            for chunk in list_util.generate_chunks(lst=indexParametersList, chunkSize=self._get_chunk_size(parametersList=[parameters for _, parameters in indexParametersList])):
+                result = await self._execute(query=query, connection=connection, parameters=[parameters for _, parameters in chunk])
+                for (index, _), rowId in zip(chunk, result.scalars(), strict=True):
+                    rowIds[index] = int(rowId)
+        return rowIds
+
+    async def _upsert_records(self, table: Table, valuesList: Sequence[CreateRecordValuesDict], conflictFieldNames: Sequence[str], updateFieldNames: Sequence[str] | None = None, connection: DatabaseConnection | None = None) -> list[int]:
+        if len(valuesList) == 0:
+            return []
+        if not connection:
+            async with self.create_transaction() as newConnection:
+                return await self._upsert_records(table=table, valuesList=valuesList, conflictFieldNames=conflictFieldNames, updateFieldNames=updateFieldNames, connection=newConnection)
+        parametersList = [self._get_query_parameters(values=values) for values in valuesList]
+        dialectName = self.database.get_dialect_name()
+        if dialectName == 'postgresql':
+            insertQuery = sqlalchemy_psql.insert(table)
+        elif dialectName == 'sqlite':
+            insertQuery = sqlalchemy_sqlite.insert(table)  # type: ignore[assignment]
+        else:
+            raise SavingException(message=f'Upserting records is not supported for {dialectName} databases')
+        conflictFields = [table.c[fieldName] for fieldName in conflictFieldNames]
+        # NOTE(krishan711): updated rows come back in no particular order so ids are matched to the input using the conflict fields
+        conflictKeyRowIdMap: dict[tuple[Any, ...], int] = {}  # type: ignore[explicit-any]
+        for fieldNames, indexParametersList in self._group_parameters_by_field_names(parametersList=parametersList).items():
+            missingConflictFieldNames = [fieldName for fieldName in conflictFieldNames if fieldName not in fieldNames]
+            if len(missingConflictFieldNames) > 0:
+                raise SavingException(message=f'Upserted records must set every conflict field, missing: {missingConflictFieldNames}')
+            # NOTE(krishan711): fields a group doesn't set are left as they are rather than overwritten with their default
+            groupUpdateFieldNames = [fieldName for fieldName in (updateFieldNames if updateFieldNames is not None else fieldNames) if fieldName in fieldNames and fieldName not in conflictFieldNames]
+            # NOTE(krishan711): an empty update would turn into DO NOTHING which doesn't return the existing id
+            setFieldNames = groupUpdateFieldNames if len(groupUpdateFieldNames) > 0 else conflictFieldNames
+            query = insertQuery.on_conflict_do_update(
+                index_elements=conflictFields,
+                set_={table.c[fieldName]: insertQuery.excluded[fieldName] for fieldName in setFieldNames},
+            ).returning(table.c.id, *conflictFields)
+            groupParametersList = [parameters for _, parameters in indexParametersList]
+            for chunk in list_util.generate_chunks(lst=groupParametersList, chunkSize=self._get_chunk_size(parametersList=groupParametersList)):
+                result = await self._execute(query=query, connection=connection, parameters=chunk)
+                for row in result:
+                    conflictKeyRowIdMap[tuple(row[1:])] = int(row[0])
+        rowIds = [conflictKeyRowIdMap[tuple(parameters[fieldName] for fieldName in conflictFieldNames)] for parameters in parametersList]
+        await self._invalidate_cached_rows(table=table, rowIds=rowIds, connection=connection)
+        return rowIds
+
+    # NOTE(krishan711): on postgres this streams the records with asyncpg's binary COPY, other databases fall back to chunked inserts.
+    # Each chunk is held in memory on its own so records can come from an unbounded async source.
+    async def _copy_records(self, table: Table, fieldNames: Sequence[str], records: AsyncIterable[Sequence[Any]], connection: DatabaseConnection | None = None, chunkSize: int = 10000) -> int:  # type: ignore[explicit-any]
+        if not connection:
+            async with self.create_transaction() as newConnection:
+                return await self._copy_records(table=table, fieldNames=fieldNames, records=records, connection=newConnection, chunkSize=chunkSize)
+        isPostgres = self.database.get_dialect_name() == 'postgresql'
+        columnNames = [table.c[fieldName].name for fieldName in fieldNames]
+        if isPostgres:
+            # NOTE(krishan711): sqlalchemy only begins the asyncpg transaction on the first statement it runs so without this the COPYs would each autocommit
+            await connection.exec_driver_sql('SELECT 1')
+        recordCount = 0
+        async for chunk in async_util.generate_chunks(iterable=records, chunkSize=chunkSize):
+            if isPostgres:
+                try:
+                    rawConnection = await connection.get_raw_connection()
+                    await rawConnection.driver_connection.copy_records_to_table(table.name, records=chunk, columns=columnNames, schema_name=table.schema)  # type: ignore[union-attr]
+                except Exception as exception:
+                    raise SavingException(message=f'Error running copy operation: {exception!s}') from exception
+            else:
+                await self._execute(query=table.insert(), connection=connection, parameters=[dict(zip(fieldNames, record, strict=True)) for record in chunk])  # type: ignore[arg-type]
+            recordCount += len(chunk)
+        return recordCount
+
     async def _update_records(self, table: Table, where: WhereClause, values: UpdateRecordValuesDict, connection: DatabaseConnection | None = None) -> list[int]:
         query = table.update().where(where).values(values).returning(table.c.id)
         result = await self._execute(query=query, connection=connection)
         rowIds = [int(rowId) for rowId in result.scalars()]
+        await self._invalidate_cached_rows(table=table, rowIds=rowIds, connection=connection)
         return rowIds
 
     async def _delete_records(self, table: Table, where: WhereClause, connection: DatabaseConnection | None = None) -> list[int]:
         query = table.delete().where(where).returning(table.c.id)
         result = await self._execute(query=query, connection=connection)
         rowIds = [int(rowId) for rowId in result.scalars()]
+        await self._invalidate_cached_rows(table=table, rowIds=rowIds, connection=connection)
         return rowIds
+
+    async def _update_records_by_id_chunk(self, table: Table, fieldNames: Sequence[str], idParametersList: Sequence[tuple[int, dict[str, Any]]], connection: DatabaseConnection) -> list[int]:  # type: ignore[explicit-any]
+        if self.database.get_dialect_name() == 'postgresql':
+            valuesClause = sqlalchemy.values(
+                sqlalchemy.column('id', table.c.id.type),
+                *[sqlalchemy.column(fieldName, table.c[fieldName].type) for fieldName in fieldNames],
+                name='kiba_values',
+            ).data([(rowId, *[parameters[fieldName] for fieldName in fieldNames]) for rowId, parameters in idParametersList])
+            # NOTE(krishan711): None values are rendered as plain NULLs so the casts stop a column of only NULLs being typed as text
+            query = table.update().where(table.c.id == valuesClause.c.id).values({table.c[fieldName]: sqlalchemy.cast(valuesClause.c[fieldName], table.c[fieldName].type) for fieldName in fieldNames}).returning(table.c.id)
+            result = await self._execute(query=query, connection=connection)
+            return [int(rowId) for rowId in result.scalars()]
+        # NOTE(krishan711): sqlalchemy can't return rows from an executemany update so the ids that exist are selected first
+        rowIds = [rowId for rowId, _ in idParametersList]
+        isLargeList = len(rowIds) > LARGE_VALUE_LIST_SIZE
+        rowIdsParameter = create_value_list_parameter(field=table.c.id, dialectName=self.database.get_dialect_name(), isLargeList=isLargeList, values=rowIds)
+        existingIdsQuery = sqlalchemy.select(table.c.id).where(create_contained_in_clause(field=table.c.id, parameter=rowIdsParameter, dialectName=self.database.get_dialect_name(), isNegated=False, isLargeList=isLargeList))
+        existingIdsResult = await self._execute(query=existingIdsQuery, connection=connection)
+        existingRowIds = [int(rowId) for rowId in existingIdsResult.scalars()]
+        updateQuery = table.update().where(table.c.id == sqlalchemy.bindparam('kiba_id')).values({table.c[fieldName]: sqlalchemy.bindparam(f'kiba_value_{fieldName}') for fieldName in fieldNames})
+        parametersList = [{'kiba_id': rowId, **{f'kiba_value_{fieldName}': parameters[fieldName] for fieldName in fieldNames}} for rowId, parameters in idParametersList]
+        await self._execute(query=updateQuery, connection=connection, parameters=parametersList)  # type: ignore[arg-type]
+        return existingRowIds
+
+    # NOTE(krishan711): this writes different values to each row, on postgres as an UPDATE ... FROM (VALUES ...) per chunk and
+    # elsewhere as an executemany. Rows are grouped by the set of fields being updated. Ids that don't exist are left out of the result.
+    async def _update_records_by_id(self, table: Table, idValuesMap: Mapping[int, UpdateRecordValuesDict], connection: DatabaseConnection | None = None) -> list[int]:
+        if len(idValuesMap) == 0:
+            return []
+        if not connection:
+            async with self.create_transaction() as newConnection:
+                return await self._update_records_by_id(table=table, idValuesMap=idValuesMap, connection=newConnection)
+        fieldNamesIdParametersMap: dict[tuple[str, ...], list[tuple[int, dict[str, Any]]]] = {}  # type: ignore[explicit-any]
+        for rowId, values in idValuesMap.items():
+            parameters = self._get_query_parameters(values=values)
+            fieldNamesIdParametersMap.setdefault(tuple(sorted(parameters.keys())), []).append((rowId, parameters))
+        updatedRowIds: set[int] = set()
+        for fieldNames, idParametersList in fieldNamesIdParametersMap.items():
+            chunkSize = max(1, MAX_QUERY_PARAMETER_COUNT // (len(fieldNames) + 1))
+            for chunk in list_util.generate_chunks(lst=idParametersList, chunkSize=chunkSize):
+                updatedRowIds.update(await self._update_records_by_id_chunk(table=table, fieldNames=fieldNames, idParametersList=chunk, connection=connection))
+        await self._invalidate_cached_rows(table=table, rowIds=list(updatedRowIds), connection=connection)
+        return [rowId for rowId in idValuesMap if rowId in updatedRowIds]
+
+    async def _delete_records_by_id(self, table: Table, rowIds: Sequence[int], connection: DatabaseConnection | None = None) -> list[int]:
+        if len(rowIds) == 0:
+            return []
+        if not connection:
+            async with self.create_transaction() as newConnection:
+                return await self._delete_records_by_id(table=table, rowIds=rowIds, connection=newConnection)
+        dialectName = self.database.get_dialect_name()
+        deletedRowIds: set[int] = set()
+        # NOTE(krishan711): the chunks keep each statement (and on postgres the locks it takes) bounded
+        for chunk in list_util.generate_chunks(lst=list(rowIds), chunkSize=MAX_QUERY_PARAMETER_COUNT):
+            isLargeList = len(chunk) > LARGE_VALUE_LIST_SIZE
+            parameter = create_value_list_parameter(field=table.c.id, dialectName=dialectName, isLargeList=isLargeList, values=chunk)
+            query = table.delete().where(create_contained_in_clause(field=table.c.id, parameter=parameter, dialectName=dialectName, isNegated=False, isLargeList=isLargeList)).returning(table.c.id)
+            result = await self._execute(query=query, connection=connection)
+            deletedRowIds.update(int(rowId) for rowId in result.scalars())
+        await self._invalidate_cached_rows(table=table, rowIds=list(deletedRowIds), connection=connection)
+        return [rowId for rowId in rowIds if rowId in deletedRowIds]
+
+
+# NOTE(krishan711): this holds writes back and sends them as multi-row statements, one per table and operation, when
+# maxOperationCount writes are pending, when flush() is called and when the batch context ends. Consecutive writes to the
+# same table and operation are merged, any other repeat flushes first so writes still happen in the order they were made.
+# Inserted ids are only known after a flush so insert_record returns a future for the id rather than the id itself.
+class SaverBatch:
+    def __init__(self, saver: Saver, connection: DatabaseConnection, maxOperationCount: int = 1000) -> None:
+        self.saver = saver
+        self.connection = connection
+        self.maxOperationCount = maxOperationCount
+        self._tableOperations: dict[tuple[Table, str], _SaverBatchOperations] = {}
+        self._operationCount = 0
+
+    async def _get_operations(self, table: Table, operationName: str) -> _SaverBatchOperations:
+        key = (table, operationName)
+        if key in self._tableOperations and next(reversed(self._tableOperations)) != key:
+            await self.flush()
+        operations = self._tableOperations.get(key)
+        if operations is None:
+            operations = _SaverBatchOperations()
+            self._tableOperations[key] = operations
+        return operations
+
+    async def _record_operation(self) -> None:
+        self._operationCount += 1
+        if self._operationCount >= self.maxOperationCount:
+            await self.flush()
+
+    async def insert_record(self, table: Table, values: CreateRecordValuesDict) -> asyncio.Future[int]:
+        operations = await self._get_operations(table=table, operationName='insert')
+        future = asyncio.get_running_loop().create_future()
+        operations.insertValuesList.append(values)
+        operations.insertFutures.append(future)
+        await self._record_operation()
+        return future
+
+    async def update_record(self, table: Table, rowId: int, values: UpdateRecordValuesDict) -> None:
+        operations = await self._get_operations(table=table, operationName='update')
+        operations.idValuesMap[rowId] = {**operations.idValuesMap.get(rowId, {}), **values}
+        await self._record_operation()
+
+    async def delete_record(self, table: Table, rowId: int) -> None:
+        operations = await self._get_operations(table=table, operationName='delete')
+        operations.deleteRowIds[rowId] = None
+        await self._record_operation()
+
+    async def flush(self) -> None:
+        tableOperations = self._tableOperations
+        self._tableOperations = {}
+        self._operationCount = 0
+        try:
+            for (table, operationName), operations in tableOperations.items():
+                if operationName == 'insert':
+                    rowIds = await self.saver._insert_records(table=table, valuesList=operations.insertValuesList, connection=self.connection)  # noqa: SLF001
+                    for future, rowId in zip(operations.insertFutures, rowIds, strict=True):
+                        future.set_result(rowId)
+                elif operationName == 'update':
+                    await self.saver._update_records_by_id(table=table, idValuesMap=operations.idValuesMap, connection=self.connection)  # noqa: SLF001
+                else:
+                    await self.saver._delete_records_by_id(table=table, rowIds=list(operations.deleteRowIds), connection=self.connection)  # noqa: SLF001
+        except BaseException:
+            self._cancel_operations(tableOperations=tableOperations)
+            raise
+
+    @staticmethod
+    def _cancel_operations(tableOperations: dict[tuple[Table, str], _SaverBatchOperations]) -> None:
+        for operations in tableOperations.values():
+            for future in operations.insertFutures:
+                future.cancel()
+
+    def cancel(self) -> None:
+        self._cancel_operations(tableOperations=self._tableOperations)
+        self._tableOperations = {}
+        self._operationCount = 0
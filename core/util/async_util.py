@@ -1,5 +1,7 @@
 import asyncio
 import typing
+from collections.abc import AsyncIterable
+from collections.abc import AsyncIterator
 
 AwaitableReturnType = typing.TypeVarTuple('AwaitableReturnType')
 
@@ -18,6 +20,17 @@ async def gather_batched[AwaitableReturnType](
     return results
 
 
+async def generate_chunks[ItemType](iterable: AsyncIterable[ItemType], chunkSize: int) -> AsyncIterator[list[ItemType]]:
+    chunk: list[ItemType] = []
+    async for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= chunkSize:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
 # NOTE(krishan711): not sure how to do the typing for this one
 # async def gather_batched_with_exceptions[AwaitableType](
 #     *awaitables: typing.Unpack[typing.Awaitable[AwaitableType]],
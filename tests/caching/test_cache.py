@@ -0,0 +1,116 @@
+import dataclasses
+import datetime
+import shutil
+import tempfile
+
+import pydantic
+import pytest
+
+from core.caching.cache import Cache
+from core.caching.cache_codec import PickleCacheCodec
+from core.caching.dict_cache import DictCache
+from core.caching.file_cache import FileCache
+from core.caching.log_file_cache import LogFileCache
+from core.caching.msgpack_cache_codec import MsgpackCacheCodec
+from core.exceptions import InternalServerErrorException
+
+
+class StringOnlyCache(Cache):
+
+    def __init__(self, isPrivate: bool = False) -> None:
+        super().__init__(isPrivate=isPrivate)
+        self.values: dict[str, str] = {}
+
+    async def set(self, key: str, value: str, expirySeconds: float) -> bool:
+        self.values[key] = value
+        return True
+
+    async def get(self, key: str) -> str | None:
+        return self.values.get(key)
+
+    async def delete(self, key: str) -> bool:
+        return self.values.pop(key, None) is not None
+
+    def can_store_complex_objects(self) -> bool:
+        return False
+
+
+class ExampleModel(pydantic.BaseModel):
+    name: str
+    date: datetime.datetime
+    values: list[int]
+
+
+@dataclasses.dataclass
+class ExampleDataclass:
+    name: str
+    count: int
+
+
+class TestCache:
+
+    async def test_bytes_fallback(self):
+        cache = StringOnlyCache()
+        await cache.set_bytes(key="key", value=b"\x00\xffbytes", expirySeconds=60)
+        assert isinstance(cache.values["key"], str)
+        assert await cache.get_bytes(key="key") == b"\x00\xffbytes"
+        assert await cache.get_bytes(key="missing") is None
+        await cache.set(key="key", value="not base64!", expirySeconds=60)
+        assert await cache.get_bytes(key="key") is None
+        await cache.set(key="key", value="dmFsdWU=", expirySeconds=60)
+        assert await cache.get_bytes(key="key") is None
+
+    async def test_many_fallback(self):
+        cache = StringOnlyCache()
+        assert await cache.set_many(values={"key1": "value1", "key2": "value2"}, expirySeconds=60) is True
+        assert cache.values == {"key1": "value1", "key2": "value2"}
+        assert await cache.get_many(keys=["key1", "missing"]) == {"key1": "value1"}
+        assert await cache.delete_many(keys=["key1", "missing"]) == 1
+        assert cache.values == {"key2": "value2"}
+
+    @pytest.mark.parametrize("cacheType", [DictCache, FileCache, LogFileCache, StringOnlyCache])
+    async def test_get_and_get_bytes_only_return_their_own_values(self, cacheType):
+        tempDirectory = tempfile.mkdtemp()
+        cache = cacheType(cacheDirectory=tempDirectory) if cacheType in {FileCache, LogFileCache} else cacheType()
+        await cache.set(key="string", value="dmFsdWU=", expirySeconds=60)
+        await cache.set_bytes(key="bytes", value=b"value", expirySeconds=60)
+        assert await cache.get(key="string") == "dmFsdWU="
+        assert await cache.get_bytes(key="string") is None
+        assert await cache.get_bytes(key="bytes") == b"value"
+        if cacheType is not StringOnlyCache:
+            assert await cache.get(key="bytes") is None
+            assert await cache.get_many(keys=["string", "bytes"]) == {"string": "dmFsdWU="}
+        if cacheType is LogFileCache:
+            cache.close()
+        shutil.rmtree(tempDirectory)
+
+    @pytest.mark.parametrize("codec", [None, MsgpackCacheCodec(), PickleCacheCodec()])
+    async def test_object_round_trip(self, codec):
+        cache = DictCache(isPrivate=True)
+        model = ExampleModel(name="name", date=datetime.datetime(2024, 1, 2, 3, 4, 5, tzinfo=datetime.UTC), values=[1, 2, 3])
+        await cache.set_object(key="model", value=model, expirySeconds=60, codec=codec)
+        assert await cache.get_object(key="model", objectType=ExampleModel, codec=codec) == model
+        await cache.set_object(key="dataclass", value=ExampleDataclass(name="name", count=3), expirySeconds=60, codec=codec)
+        assert await cache.get_object(key="dataclass", objectType=ExampleDataclass, codec=codec) == ExampleDataclass(name="name", count=3)
+        await cache.set_object(key="list", value=[{"a": 1}, {"b": 2}], expirySeconds=60, codec=codec)
+        assert await cache.get_object(key="list", objectType=list[dict[str, int]], codec=codec) == [{"a": 1}, {"b": 2}]
+        assert await cache.get_object(key="missing", objectType=ExampleModel, codec=codec) is None
+
+    async def test_object_fallback_cache(self):
+        cache = StringOnlyCache()
+        await cache.set_object(key="dataclass", value=ExampleDataclass(name="name", count=3), expirySeconds=60)
+        assert await cache.get_object(key="dataclass", objectType=ExampleDataclass) == ExampleDataclass(name="name", count=3)
+
+    async def test_get_object_with_invalid_value_returns_none(self):
+        cache = DictCache()
+        await cache.set_object(key="key", value={"name": "name"}, expirySeconds=60)
+        assert await cache.get_object(key="key", objectType=ExampleDataclass) is None
+        await cache.set_bytes(key="key", value=b"not json", expirySeconds=60)
+        assert await cache.get_object(key="key", objectType=ExampleDataclass) is None
+
+    async def test_pickle_codec_requires_private_cache(self):
+        cache = DictCache(isPrivate=False)
+        with pytest.raises(InternalServerErrorException):
+            await cache.set_object(key="key", value="value", expirySeconds=60, codec=PickleCacheCodec())
+        with pytest.raises(InternalServerErrorException):
+            await cache.get_object(key="key", objectType=str, codec=PickleCacheCodec())
@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from core.caching.cached import CachedValue
+from core.caching.cached import cached
+from core.caching.dict_cache import DictCache
+from core.util import date_util
+
+
+class TestCached:
+
+    @pytest.fixture
+    def cache(self) -> DictCache:
+        return DictCache()
+
+    async def test_caches_result(self, cache: DictCache):
+        callArguments: list[int] = []
+
+        @cached(cache=cache, ttl=60)
+        async def double(value: int) -> int:
+            callArguments.append(value)
+            return value * 2
+
+        assert await double(value=2) == 4
+        assert await double(value=2) == 4
+        assert await double(value=3) == 6
+        assert callArguments == [2, 3]
+
+    async def test_key_function(self, cache: DictCache):
+        @cached(cache=cache, ttl=60, key=lambda name: f"greeting:{name}")
+        async def greet(name: str) -> str:
+            return f"hello {name}"
+
+        assert await greet(name="kiba") == "hello kiba"
+        assert await cache.get_object(key="greeting:kiba", objectType=CachedValue[str]) is not None
+
+    async def test_concurrent_misses_are_coalesced(self, cache: DictCache):
+        callCount = 0
+
+        @cached(cache=cache, ttl=60)
+        async def slow_value() -> list[str]:
+            nonlocal callCount
+            callCount += 1
+            await asyncio.sleep(0.05)
+            return ["value"]
+
+        results = await asyncio.gather(*[slow_value() for _ in range(10)])
+        assert results == [["value"]] * 10
+        assert callCount == 1
+
+    async def test_failures_are_shared_and_not_cached(self, cache: DictCache):
+        callCount = 0
+
+        @cached(cache=cache, ttl=60)
+        async def failing_value() -> int:
+            nonlocal callCount
+            callCount += 1
+            await asyncio.sleep(0.01)
+            raise ValueError("failed")
+
+        results = await asyncio.gather(*[failing_value() for _ in range(5)], return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        assert callCount == 1
+        with pytest.raises(ValueError):
+            await failing_value()
+        assert callCount == 2
+
+    async def test_stale_value_is_returned_while_refreshing(self, cache: DictCache):
+        @cached(cache=cache, ttl=60, key=lambda: "stale", staleTtl=60)
+        async def fresh_value() -> str:
+            return "fresh"
+
+        await cache.set_object(key="stale", value=CachedValue(value="stale", expiryTimestamp=date_util.datetime_from_now(seconds=-1).timestamp(), computeSeconds=0), expirySeconds=60)
+        assert await fresh_value() == "stale"
+        await asyncio.sleep(0.01)
+        assert await fresh_value() == "fresh"
+
+    async def test_early_expiry(self, cache: DictCache):
+        callCount = 0
+
+        @cached(cache=cache, ttl=60, key=lambda: "early")
+        async def early_value() -> int:
+            nonlocal callCount
+            callCount += 1
+            return callCount
+
+        @cached(cache=cache, ttl=60, key=lambda: "early", earlyExpiryBeta=0)
+        async def no_early_value() -> int:
+            nonlocal callCount
+            callCount += 1
+            return callCount
+
+        # NOTE(krishan711): a value close to expiry that was slow to compute is (almost) always refreshed early
+        await cache.set_object(key="early", value=CachedValue(value=0, expiryTimestamp=date_util.datetime_from_now(seconds=1).timestamp(), computeSeconds=10000), expirySeconds=60)
+        assert await no_early_value() == 0
+        await asyncio.sleep(0.01)
+        assert callCount == 0
+        assert await early_value() == 0
+        await asyncio.sleep(0.01)
+        assert callCount == 1
+        assert await early_value() == 1
+
+    async def test_methods_share_default_key(self, cache: DictCache):
+        callCount = 0
+
+        class Service:
+
+            @cached(cache=cache, ttl=60)
+            async def double(self, value: int) -> int:
+                nonlocal callCount
+                callCount += 1
+                return value * 2
+
+        assert await Service().double(value=1) == 2
+        assert await Service().double(value=1) == 2
+        assert callCount == 1
+        assert cache.get_stats().entryCount == 1
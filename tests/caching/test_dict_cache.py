@@ -65,3 +65,60 @@ class TestDictCache:
         assert private_cache.isPrivate is True
         public_cache = DictCache(isPrivate=False)
         assert public_cache.isPrivate is False
+
+    async def test_max_entry_count_evicts_least_recently_used(self):
+        cache = DictCache(maxEntryCount=2)
+        await cache.set(key="key1", value="value1", expirySeconds=60)
+        await cache.set(key="key2", value="value2", expirySeconds=60)
+        assert await cache.get(key="key1") == "value1"
+        await cache.set(key="key3", value="value3", expirySeconds=60)
+        assert await cache.get(key="key2") is None
+        assert await cache.get(key="key1") == "value1"
+        assert await cache.get(key="key3") == "value3"
+        stats = cache.get_stats()
+        assert stats.entryCount == 2
+        assert stats.evictionCount == 1
+        assert stats.hitCount == 3
+        assert stats.missCount == 1
+
+    async def test_max_byte_count(self):
+        cache = DictCache(maxByteCount=1000)
+        for index in range(100):
+            await cache.set(key=f"key{index}", value="x" * 100, expirySeconds=60)
+        stats = cache.get_stats()
+        assert 0 < stats.byteCount <= 1000
+        assert stats.entryCount + stats.evictionCount == 100
+        assert await cache.get(key="key99") == "x" * 100
+        await cache.delete(key="key99")
+        assert cache.get_stats().byteCount < stats.byteCount
+        assert cache.get_stats().entryCount == stats.entryCount - 1
+
+    async def test_expired_entries_are_swept(self, monkeypatch):
+        cache = DictCache(expirySweepInterval=10)
+        for index in range(5):
+            await cache.set(key=f"old{index}", value="value", expirySeconds=1)
+        await cache.set(key="old0", value="value", expirySeconds=120)
+        future_time = date_util.datetime_from_now(seconds=61)
+        original_datetime_from_now = date_util.datetime_from_now
+        monkeypatch.setattr(date_util, "datetime_from_now", lambda seconds=0: original_datetime_from_now(seconds=seconds + 61) if seconds else future_time)
+        for index in range(4):
+            await cache.set(key=f"new{index}", value="value", expirySeconds=60)
+        stats = cache.get_stats()
+        assert stats.entryCount == 5
+        assert stats.expiryCount == 4
+        assert await cache.get(key="old0") == "value"
+
+    async def test_set_and_get_bytes(self, cache: DictCache):
+        await cache.set_bytes(key="bytes_key", value=b"\x00\xffvalue", expirySeconds=60)
+        assert await cache.get_bytes(key="bytes_key") == b"\x00\xffvalue"
+        assert await cache.get(key="bytes_key") is None
+        await cache.set(key="str_key", value="value", expirySeconds=60)
+        assert await cache.get_bytes(key="str_key") is None
+
+    async def test_get_set_delete_many(self, cache: DictCache):
+        assert await cache.set_many(values={"key1": "value1", "key2": "value2", "key3": "value3"}, expirySeconds=60) is True
+        assert await cache.get_many(keys=["key1", "key3", "missing"]) == {"key1": "value1", "key3": "value3"}
+        assert cache.get_stats().hitCount == 2
+        assert cache.get_stats().missCount == 1
+        assert await cache.delete_many(keys=["key1", "key2", "missing"]) == 2
+        assert await cache.get_many(keys=["key1", "key2", "key3"]) == {"key3": "value3"}
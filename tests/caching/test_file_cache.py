@@ -150,3 +150,31 @@ class TestFileCache:
         internal_result = await cache._internal_get(key=key)
         regular_result = await cache.get(key=key)
         assert internal_result == regular_result == value
+
+    async def test_set_and_get_bytes(self, cache: FileCache, cache_dir):
+        await cache.set_bytes(key="test_key", value=b"\x00\xffvalue", expirySeconds=60)
+        assert await cache.get_bytes(key="test_key") == b"\x00\xffvalue"
+        with open(os.path.join(cache_dir, "test_key", "content.bin"), "rb") as contentFile:
+            assert contentFile.read() == b"\x00\xffvalue"
+        assert await cache.get_bytes(key="nonexistent") is None
+
+    async def test_get_set_delete_many(self, cache: FileCache, monkeypatch):
+        assert await cache.set_many(values={"key1": "value1", "key2": "value2", "key3": "value3"}, expirySeconds=60) is True
+        assert await cache.get(key="key2") == "value2"
+        assert await cache.get_many(keys=["key1", "key3", "missing"]) == {"key1": "value1", "key3": "value3"}
+        assert await cache.delete_many(keys=["key1", "key2", "missing"]) == 2
+        assert await cache.get_many(keys=["key1", "key2", "key3"]) == {"key3": "value3"}
+        future_time = date_util.datetime_from_now(seconds=61)
+        monkeypatch.setattr(date_util, "datetime_from_now", lambda: future_time)
+        assert await cache.get_many(keys=["key3"]) == {}
+
+    async def test_get_bytes_value_as_string(self, cache: FileCache):
+        await cache.set_bytes(key="test_key", value=b"\xff\xfe", expirySeconds=60)
+        assert await cache.get(key="test_key") is None
+        assert await cache.get_many(keys=["test_key"]) == {}
+        assert await cache.get_bytes(key="test_key") == b"\xff\xfe"
+        await cache.set(key="test_key", value="value", expirySeconds=60)
+        assert await cache.get_bytes(key="test_key") is None
+        assert await cache.get(key="test_key") == "value"
+        assert await cache.delete(key="test_key") is True
+        assert await cache.get(key="test_key") is None
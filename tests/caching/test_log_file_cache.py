@@ -0,0 +1,113 @@
+import asyncio
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from core.caching.log_file_cache import LogFileCache
+from core.util import date_util
+
+
+class TestLogFileCache:
+
+    @pytest.fixture
+    def cache_dir(self):
+        tempDirectory = tempfile.mkdtemp()
+        yield tempDirectory
+        shutil.rmtree(tempDirectory)
+
+    @pytest.fixture
+    def cache(self, cache_dir):
+        cache = LogFileCache(cacheDirectory=cache_dir)
+        yield cache
+        cache.close()
+
+    async def test_set_and_get(self, cache: LogFileCache):
+        success = await cache.set(key="test_key", value="test_value", expirySeconds=60)
+        assert success is True
+        assert await cache.get(key="test_key") == "test_value"
+        assert await cache.get(key="nonexistent") is None
+
+    async def test_overwrite_and_delete(self, cache: LogFileCache):
+        await cache.set(key="test_key", value="test_value_1", expirySeconds=60)
+        await cache.set(key="test_key", value="test_välue_2", expirySeconds=60)
+        assert await cache.get(key="test_key") == "test_välue_2"
+        assert await cache.delete(key="test_key") is True
+        assert await cache.get(key="test_key") is None
+        assert await cache.delete(key="test_key") is False
+
+    async def test_expiry(self, cache: LogFileCache, monkeypatch):
+        await cache.set(key="test_key", value="test_value", expirySeconds=60)
+        future_time = date_util.datetime_from_now(seconds=61)
+        monkeypatch.setattr(date_util, "datetime_from_now", lambda: future_time)
+        assert await cache.get(key="test_key") is None
+
+    async def test_single_file_structure(self, cache: LogFileCache, cache_dir):
+        for index in range(10):
+            await cache.set(key=f"key_{index}", value=f"value_{index}", expirySeconds=60)
+        assert os.listdir(cache_dir) == ['cache.log']
+
+    async def test_reopen_rebuilds_index(self, cache: LogFileCache, cache_dir):
+        await cache.set(key="key1", value="value1", expirySeconds=60)
+        await cache.set(key="key2", value="value2", expirySeconds=60)
+        await cache.set(key="key1", value="value1b", expirySeconds=60)
+        await cache.delete(key="key2")
+        cache.close()
+        with open(os.path.join(cache_dir, 'cache.log'), 'ab') as logFile:
+            logFile.write(b'partial')
+        reopenedCache = LogFileCache(cacheDirectory=cache_dir)
+        assert await reopenedCache.get(key="key1") == "value1b"
+        assert await reopenedCache.get(key="key2") is None
+        await reopenedCache.set(key="key3", value="value3", expirySeconds=60)
+        reopenedCache.close()
+        reopenedCache = LogFileCache(cacheDirectory=cache_dir)
+        assert await reopenedCache.get(key="key3") == "value3"
+        assert await reopenedCache.get(key="key1") == "value1b"
+        reopenedCache.close()
+
+    async def test_compaction(self, cache_dir):
+        cache = LogFileCache(cacheDirectory=cache_dir, minCompactionByteCount=1000)
+        for index in range(200):
+            await cache.set(key=f"key_{index % 5}", value=f"value_{index}", expirySeconds=60)
+        assert os.path.getsize(os.path.join(cache_dir, 'cache.log')) < 2000
+        assert [await cache.get(key=f"key_{index}") for index in range(5)] == [f"value_{index}" for index in range(195, 200)]
+        cache.close()
+
+    async def test_concurrent_compaction(self, cache_dir):
+        cache = LogFileCache(cacheDirectory=cache_dir, minCompactionByteCount=1000)
+
+        async def set_and_get(index: int) -> str | None:
+            await cache.set(key=f"key_{index % 5}", value=f"value_{index}", expirySeconds=60)
+            return await cache.get(key=f"key_{index % 5}")
+
+        results = await asyncio.gather(*[set_and_get(index=index) for index in range(200)])
+        assert all(result is not None for result in results)
+        assert os.path.getsize(os.path.join(cache_dir, 'cache.log')) < 2000
+        assert [await cache.get(key=f"key_{index}") for index in range(5)] == [f"value_{index}" for index in range(195, 200)]
+        cache.close()
+
+    async def test_get_bytes_value_as_string(self, cache: LogFileCache, cache_dir):
+        await cache.set_bytes(key="test_key", value=b"\xff\xfe", expirySeconds=60)
+        assert await cache.get(key="test_key") is None
+        assert await cache.get_many(keys=["test_key"]) == {}
+        await cache.set(key="other_key", value="value", expirySeconds=60)
+        assert await cache.get_bytes(key="other_key") is None
+        cache.close()
+        reopenedCache = LogFileCache(cacheDirectory=cache_dir)
+        assert await reopenedCache.get(key="test_key") is None
+        assert await reopenedCache.get_bytes(key="test_key") == b"\xff\xfe"
+        assert await reopenedCache.get(key="other_key") == "value"
+        assert await reopenedCache.get_bytes(key="other_key") is None
+        reopenedCache.close()
+
+    def test_can_store_complex_objects(self, cache: LogFileCache):
+        assert cache.can_store_complex_objects() is False
+
+    async def test_set_and_get_bytes(self, cache: LogFileCache, cache_dir):
+        await cache.set_bytes(key="test_key", value=b"\x00\xffvalue", expirySeconds=60)
+        assert await cache.get_bytes(key="test_key") == b"\x00\xffvalue"
+        cache.close()
+        reopenedCache = LogFileCache(cacheDirectory=cache_dir)
+        assert await reopenedCache.get_bytes(key="test_key") == b"\x00\xffvalue"
+        reopenedCache.close()
@@ -0,0 +1,50 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+import sqlalchemy
+
+from core.store.database import Database
+
+# NOTE(krishan711): set this to a postgres connection string to also run the postgres only tests (they create and drop their own tables)
+PSQL_CONNECTION_STRING_ENVIRONMENT_VARIABLE = 'KIBA_TEST_PSQL_CONNECTION_STRING'
+
+TestMetadata = sqlalchemy.MetaData()
+
+TestTable = sqlalchemy.Table(
+    'tbl_test',
+    TestMetadata,
+    sqlalchemy.Column(key='id', name='id', type_=sqlalchemy.Integer, autoincrement=True, primary_key=True, nullable=False),
+    sqlalchemy.Column(key='name', name='name', type_=sqlalchemy.Text, nullable=False),
+    sqlalchemy.Column(key='value', name='value', type_=sqlalchemy.Integer, nullable=True),
+    sqlalchemy.Column(key='date', name='date', type_=sqlalchemy.DateTime, nullable=True),
+)
+
+
+@pytest.fixture
+async def database():
+    tempDirectory = tempfile.mkdtemp()
+    database = Database(connectionString=Database.create_sqlite_connection_string(filename=os.path.join(tempDirectory, 'test.db')))
+    await database.connect(poolSize=5)
+    async with database.create_transaction() as connection:
+        await connection.run_sync(TestMetadata.create_all)
+    yield database
+    await database.disconnect()
+    shutil.rmtree(tempDirectory)
+
+
+@pytest.fixture
+async def psql_database():
+    connectionString = os.environ.get(PSQL_CONNECTION_STRING_ENVIRONMENT_VARIABLE)
+    if not connectionString:
+        pytest.skip(f'{PSQL_CONNECTION_STRING_ENVIRONMENT_VARIABLE} is not set')
+    database = Database(connectionString=connectionString)
+    await database.connect(poolSize=5)
+    async with database.create_transaction() as connection:
+        await connection.run_sync(TestMetadata.drop_all)
+        await connection.run_sync(TestMetadata.create_all)
+    yield database
+    async with database.create_transaction() as connection:
+        await connection.run_sync(TestMetadata.drop_all)
+    await database.disconnect()
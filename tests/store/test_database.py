@@ -0,0 +1,262 @@
+import asyncio
+import os
+import shutil
+import tempfile
+
+import pytest
+import sqlalchemy
+
+from core.store.database import Database
+from core.store.database import DatabaseConnectionConfig
+from core.store.database import DatabaseRetryConfig
+from core.store.query_stats import QueryStatsRecorder
+
+TestMetadata = sqlalchemy.MetaData()
+
+class ExampleSqlStateError(Exception):
+    def __init__(self, sqlstate: str) -> None:
+        super().__init__(f'error {sqlstate}')
+        self.sqlstate = sqlstate
+
+
+TestTable = sqlalchemy.Table(
+    'tbl_test',
+    TestMetadata,
+    sqlalchemy.Column(key='id', name='id', type_=sqlalchemy.Integer, autoincrement=True, primary_key=True, nullable=False),
+    sqlalchemy.Column(key='name', name='name', type_=sqlalchemy.Text, nullable=False),
+)
+
+
+class TestDatabase:
+
+    @pytest.fixture
+    def temp_directory(self):
+        tempDirectory = tempfile.mkdtemp()
+        yield tempDirectory
+        shutil.rmtree(tempDirectory)
+
+    async def _create_database_file(self, filePath: str, name: str) -> None:
+        database = Database(connectionString=Database.create_sqlite_connection_string(filename=filePath))
+        await database.connect(poolSize=1)
+        async with database.create_transaction() as connection:
+            await connection.run_sync(TestMetadata.create_all)
+            await database.execute(query=TestTable.insert().values(name=name), connection=connection)
+        await database.disconnect()
+
+    @pytest.fixture
+    async def replicated_database(self, temp_directory: str):
+        # NOTE: the replica is a separate file with different content so reads show which database they went to
+        primaryFilePath = os.path.join(temp_directory, 'primary.db')
+        replicaFilePath = os.path.join(temp_directory, 'replica.db')
+        await self._create_database_file(filePath=primaryFilePath, name='primary')
+        await self._create_database_file(filePath=replicaFilePath, name='replica')
+        database = Database(connectionString=Database.create_sqlite_connection_string(filename=primaryFilePath), replicaConnectionStrings=[Database.create_sqlite_connection_string(filename=replicaFilePath)])
+        await database.connect(poolSize=5)
+        yield database
+        await database.disconnect()
+
+    async def _get_names(self, database: Database) -> list[str]:
+        result = await database.execute(query=sqlalchemy.select(TestTable.c.name).order_by(TestTable.c.id))
+        return list(result.scalars())
+
+    async def test_context_reads_go_to_replica(self, replicated_database: Database):
+        async with replicated_database.create_context_connection():
+            assert await self._get_names(database=replicated_database) == ['replica']
+
+    async def test_context_reads_go_to_primary_after_write(self, replicated_database: Database):
+        async with replicated_database.create_context_connection():
+            await replicated_database.execute(query=TestTable.insert().values(name='written'))
+            assert await self._get_names(database=replicated_database) == ['primary', 'written']
+
+    async def test_context_reads_stay_on_replica_without_read_your_writes(self, replicated_database: Database):
+        replicated_database.shouldReadYourWrites = False
+        async with replicated_database.create_context_connection():
+            await replicated_database.execute(query=TestTable.insert().values(name='written'))
+            assert await self._get_names(database=replicated_database) == ['replica']
+
+    async def test_transactions_use_primary(self, replicated_database: Database):
+        async with replicated_database.create_transaction() as connection:
+            result = await replicated_database.execute(query=sqlalchemy.select(TestTable.c.name), connection=connection)
+            assert list(result.scalars()) == ['primary']
+        async with replicated_database.create_read_transaction() as connection:
+            result = await replicated_database.execute(query=sqlalchemy.select(TestTable.c.name), connection=connection)
+            assert list(result.scalars()) == ['replica']
+
+    async def test_get_pool_stats(self, temp_directory: str):
+        filePath = os.path.join(temp_directory, 'database.db')
+        await self._create_database_file(filePath=filePath, name='name')
+        database = Database(connectionString=Database.create_sqlite_connection_string(filename=filePath))
+        await database.connect(poolSize=5)
+        async with database.create_transaction():
+            poolStats = database.get_pool_stats()
+            assert [stats.name for stats in poolStats] == ['primary']
+            assert poolStats[0].poolSize == 5
+            assert poolStats[0].checkedOutCount == 1
+        async with database.create_context_connection():
+            await self._get_names(database=database)
+        poolStats = database.get_pool_stats()[0]
+        assert poolStats.checkedOutCount == 0
+        assert poolStats.acquireCount == 2
+        assert poolStats.openedConnectionCount == 1
+        assert poolStats.maxAcquireSeconds > 0
+        database.log_pool_stats()
+        await database.disconnect()
+        assert database.get_pool_stats() == []
+
+    @pytest.mark.parametrize('shouldPrePing', [True, False])
+    async def test_get_pool_stats_pre_ping_failures(self, temp_directory: str, shouldPrePing: bool):
+        database = Database(connectionString=Database.create_sqlite_connection_string(filename=os.path.join(temp_directory, 'database.db')))
+        await database.connect(config=DatabaseConnectionConfig(poolSize=1, shouldPrePing=shouldPrePing))
+        async with database._engine.connect() as connection:
+            await connection.invalidate(exception=sqlalchemy.exc.DisconnectionError())
+        assert database.get_pool_stats()[0].prePingFailureCount == (1 if shouldPrePing else 0)
+        await database.disconnect()
+
+    async def test_query_stats_recorder(self, temp_directory: str):
+        filePath = os.path.join(temp_directory, 'database.db')
+        await self._create_database_file(filePath=filePath, name='name')
+        queryStatsRecorder = QueryStatsRecorder(slowQueryThresholdSeconds=0)
+        database = Database(connectionString=Database.create_sqlite_connection_string(filename=filePath), queryStatsRecorder=queryStatsRecorder)
+        await database.connect(poolSize=1)
+        async with database.create_context_connection():
+            await self._get_names(database=database)
+            await self._get_names(database=database)
+        await database.disconnect()
+        queryStats = [queryStats for queryStats in queryStatsRecorder.get_top_query_stats() if 'tbl_test' in queryStats.fingerprint]
+        assert len(queryStats) == 1
+        assert queryStats[0].count == 2
+
+    async def test_query_stats_recorder_failed_query(self, temp_directory: str):
+        database = Database(connectionString=Database.create_sqlite_connection_string(filename=os.path.join(temp_directory, 'database.db')), queryStatsRecorder=QueryStatsRecorder())
+        await database.connect(poolSize=1)
+        async with database.create_transaction() as connection:
+            for _ in range(3):
+                with pytest.raises(sqlalchemy.exc.OperationalError):
+                    await connection.execute(sqlalchemy.text('SELECT * FROM tbl_missing'))
+            assert connection.info.get('kibaQueryStartTimes') == []
+        await database.disconnect()
+
+    async def test_gather_queries(self, temp_directory: str):
+        filePath = os.path.join(temp_directory, 'database.db')
+        await self._create_database_file(filePath=filePath, name='name')
+        database = Database(connectionString=Database.create_sqlite_connection_string(filename=filePath))
+        await database.connect(poolSize=5)
+        usedConnections = []
+
+        async def get_names_with_connection() -> list[str]:
+            usedConnections.append(database._get_context_connection())
+            await asyncio.sleep(0.01)
+            return await self._get_names(database=database)
+
+        async with database.create_context_connection() as contextConnection:
+            results = await database.gather_queries(*[get_names_with_connection() for _ in range(4)], maxConcurrency=2)
+            assert database._get_context_connection() is contextConnection
+        assert results == [['name'], ['name'], ['name'], ['name']]
+        assert contextConnection not in usedConnections
+        assert len({id(connection) for connection in usedConnections}) == 4
+        await database.disconnect()
+
+    async def test_connect_with_config(self, temp_directory: str):
+        filePath = os.path.join(temp_directory, 'database.db')
+        await self._create_database_file(filePath=filePath, name='name')
+        database = Database(connectionString=Database.create_sqlite_connection_string(filename=filePath))
+        await database.connect(config=DatabaseConnectionConfig(poolSize=3, maxOverflow=0, warmupConnectionCount=5))
+        poolStats = database.get_pool_stats()[0]
+        assert poolStats.poolSize == 3
+        assert poolStats.openedConnectionCount == 3
+        assert poolStats.checkedOutCount == 0
+        async with database.create_context_connection():
+            assert await self._get_names(database=database) == ['name']
+        assert database.get_pool_stats()[0].openedConnectionCount == 3
+        await database.disconnect()
+
+    def test_is_transient_error(self):
+        assert Database.is_transient_error(exception=sqlalchemy.exc.OperationalError(statement='', params=None, orig=ExampleSqlStateError(sqlstate='40001')))
+        assert Database.is_transient_error(exception=sqlalchemy.exc.OperationalError(statement='', params=None, orig=ExampleSqlStateError(sqlstate='40P01')))
+        assert Database.is_transient_error(exception=sqlalchemy.exc.OperationalError(statement='', params=None, orig=ExampleSqlStateError(sqlstate='08006')))
+        assert Database.is_transient_error(exception=sqlalchemy.exc.OperationalError(statement='', params=None, orig=Exception('database is locked')))
+        assert Database.is_transient_error(exception=ConnectionResetError())
+        assert not Database.is_transient_error(exception=sqlalchemy.exc.IntegrityError(statement='', params=None, orig=ExampleSqlStateError(sqlstate='23505')))
+        assert not Database.is_transient_error(exception=ValueError('database is locked'))
+        try:
+            try:
+                raise ConnectionResetError
+            except ConnectionResetError as exception:
+                raise ValueError from exception
+        except ValueError as exception:
+            assert Database.is_transient_error(exception=exception)
+
+    async def test_run_transaction_retries_transient_errors(self, temp_directory: str):
+        filePath = os.path.join(temp_directory, 'database.db')
+        await self._create_database_file(filePath=filePath, name='name')
+        database = Database(connectionString=Database.create_sqlite_connection_string(filename=filePath), retryConfig=DatabaseRetryConfig(maxAttemptCount=3, initialBackoffSeconds=0.001))
+        await database.connect(poolSize=1)
+        attemptCount = 0
+        async def insert_name(connection):
+            nonlocal attemptCount
+            attemptCount += 1
+            await database.execute(query=TestTable.insert().values(name=f'attempt-{attemptCount}'), connection=connection)
+            if attemptCount < 3:
+                raise sqlalchemy.exc.OperationalError(statement='', params=None, orig=ExampleSqlStateError(sqlstate='40001'))
+            return attemptCount
+        assert await database.run_transaction(function=insert_name) == 3
+        async with database.create_context_connection():
+            assert await self._get_names(database=database) == ['name', 'attempt-3']
+        attemptCount = 0
+        with pytest.raises(sqlalchemy.exc.OperationalError):
+            await database.run_transaction(function=insert_name, retryConfig=DatabaseRetryConfig(maxAttemptCount=2, initialBackoffSeconds=0.001))
+        assert attemptCount == 2
+        async def fail(connection):
+            nonlocal attemptCount
+            attemptCount += 1
+            raise ValueError
+        attemptCount = 0
+        with pytest.raises(ValueError):
+            await database.run_transaction(function=fail)
+        assert attemptCount == 1
+        await database.disconnect()
+
+    async def test_run_transaction_does_not_retry_after_commit_starts(self, temp_directory: str):
+        filePath = os.path.join(temp_directory, 'database.db')
+        await self._create_database_file(filePath=filePath, name='name')
+        database = Database(connectionString=Database.create_sqlite_connection_string(filename=filePath), retryConfig=DatabaseRetryConfig(maxAttemptCount=3, initialBackoffSeconds=0.001))
+        await database.connect(poolSize=1)
+        attemptCount = 0
+        async def fail_after_commit():
+            raise ConnectionError('failed')
+        async def insert_name(connection):
+            nonlocal attemptCount
+            attemptCount += 1
+            await database.execute(query=TestTable.insert().values(name=f'attempt-{attemptCount}'), connection=connection)
+            database.add_after_commit_callback(connection=connection, callback=fail_after_commit)
+            return attemptCount
+        assert await database.run_transaction(function=insert_name) == 1
+        async with database.create_context_connection():
+            assert await self._get_names(database=database) == ['name', 'attempt-1']
+        def fail_commit(connection):
+            raise ConnectionError('failed')
+        sqlalchemy.event.listen(database._engine.sync_engine, 'commit', fail_commit)
+        attemptCount = 0
+        with pytest.raises(ConnectionError):
+            await database.run_transaction(function=insert_name)
+        assert attemptCount == 1
+        sqlalchemy.event.remove(database._engine.sync_engine, 'commit', fail_commit)
+        await database.disconnect()
+
+    async def test_concurrent_operation_error_only_invalidates_connection(self, temp_directory: str):
+        filePath = os.path.join(temp_directory, 'database.db')
+        await self._create_database_file(filePath=filePath, name='name')
+        database = Database(connectionString=Database.create_sqlite_connection_string(filename=filePath))
+        await database.connect(poolSize=2)
+        async with database.create_transaction() as otherConnection:
+            async with database.create_context_connection():
+                await database.execute(query=sqlalchemy.select(TestTable.c.name))
+                raise sqlalchemy.exc.InterfaceError(statement='', params=None, orig=Exception('cannot perform operation: another operation is in progress'))
+            result = await database.execute(query=sqlalchemy.select(TestTable.c.name), connection=otherConnection)
+            assert list(result.scalars()) == ['name']
+        poolStats = database.get_pool_stats()[0]
+        assert poolStats.openedConnectionCount == 2
+        assert poolStats.closedConnectionCount == 1
+        async with database.create_context_connection():
+            assert await self._get_names(database=database) == ['name']
+        await database.disconnect()
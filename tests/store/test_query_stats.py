@@ -0,0 +1,38 @@
+from core.store.query_stats import QueryStatsRecorder
+
+
+class TestQueryStatsRecorder:
+
+    def test_create_fingerprint_replaces_values(self):
+        fingerprint = QueryStatsRecorder.create_fingerprint(statement="SELECT id FROM tbl_test\n  WHERE name = 'abc' AND value > 12 AND other = $1")
+        assert fingerprint == 'SELECT id FROM tbl_test WHERE name = ? AND value > ? AND other = ?'
+
+    def test_create_fingerprint_collapses_lists(self):
+        fingerprint = QueryStatsRecorder.create_fingerprint(statement='SELECT id FROM tbl_test WHERE id IN ($1, $2, $3)')
+        assert fingerprint == QueryStatsRecorder.create_fingerprint(statement='SELECT id FROM tbl_test WHERE id IN ($1, $2)')
+        fingerprint = QueryStatsRecorder.create_fingerprint(statement='INSERT INTO tbl_test (name, value) VALUES (?, ?), (?, ?), (?, ?)')
+        assert fingerprint == QueryStatsRecorder.create_fingerprint(statement='INSERT INTO tbl_test (name, value) VALUES (?, ?)')
+
+    def test_create_fingerprint_keeps_casts(self):
+        fingerprint = QueryStatsRecorder.create_fingerprint(statement='SELECT value::text FROM tbl_test WHERE name = :name')
+        assert fingerprint == 'SELECT value::text FROM tbl_test WHERE name = ?'
+
+    def test_record_query(self):
+        recorder = QueryStatsRecorder(slowQueryThresholdSeconds=None)
+        recorder.record_query(statement='SELECT id FROM tbl_test WHERE id = $1', durationSeconds=0.5, rowCount=1)
+        recorder.record_query(statement='SELECT id FROM tbl_test WHERE id = ?', durationSeconds=1.5, rowCount=-1)
+        recorder.record_query(statement='SELECT name FROM tbl_test', durationSeconds=1, rowCount=10)
+        topQueryStats = recorder.get_top_query_stats(count=1)
+        assert len(topQueryStats) == 1
+        assert topQueryStats[0].fingerprint == 'SELECT id FROM tbl_test WHERE id = ?'
+        assert topQueryStats[0].count == 2
+        assert topQueryStats[0].totalSeconds == 2
+        assert topQueryStats[0].maxSeconds == 1.5
+        assert topQueryStats[0].totalRowCount == 1
+
+    def test_record_query_evicts_cheapest_fingerprint(self):
+        recorder = QueryStatsRecorder(slowQueryThresholdSeconds=None, maxFingerprintCount=2)
+        recorder.record_query(statement='SELECT a FROM tbl_test', durationSeconds=1, rowCount=1)
+        recorder.record_query(statement='SELECT b FROM tbl_test', durationSeconds=0.1, rowCount=1)
+        recorder.record_query(statement='SELECT c FROM tbl_test', durationSeconds=2, rowCount=1)
+        assert [queryStats.fingerprint for queryStats in recorder.get_top_query_stats()] == ['SELECT c FROM tbl_test', 'SELECT a FROM tbl_test']
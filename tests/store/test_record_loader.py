@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from core.exceptions import InternalServerErrorException
+from core.store.database import Database
+from core.store.record_loader import RecordLoader
+from core.store.saver import Saver
+from tests.store.conftest import TestTable
+
+
+class TestRecordLoader:
+
+    @pytest.fixture
+    async def database(self, database: Database):
+        await Saver(database=database)._insert_records(table=TestTable, valuesList=[{'name': f'name-{index}'} for index in range(10)])
+        return database
+
+    @pytest.fixture
+    def executed_queries(self, database: Database, monkeypatch):
+        executedQueries = []
+        originalExecute = database.execute
+
+        async def execute(query, **kwargs):
+            executedQueries.append(query)
+            return await originalExecute(query=query, **kwargs)
+
+        monkeypatch.setattr(database, 'execute', execute)
+        return executedQueries
+
+    async def test_load_batches_values_in_one_tick(self, database: Database, executed_queries: list):
+        recordLoader = RecordLoader(database=database)
+        async with database.create_context_connection(), recordLoader.create_context():
+            rows = await asyncio.gather(*[recordLoader.load(table=TestTable, fieldName='id', value=rowId) for rowId in [1, 2, 3, 2, 100]])
+        assert [row.name if row else None for row in rows] == ['name-0', 'name-1', 'name-2', 'name-1', None]
+        assert len(executed_queries) == 1
+
+    async def test_load_cancelled_caller_does_not_cancel_others(self, database: Database):
+        recordLoader = RecordLoader(database=database)
+        async with database.create_context_connection(), recordLoader.create_context():
+            cancelledTask = asyncio.create_task(recordLoader.load(table=TestTable, fieldName='id', value=1))
+            otherTask = asyncio.create_task(recordLoader.load(table=TestTable, fieldName='id', value=1))
+            await asyncio.sleep(0)
+            cancelledTask.cancel()
+            row = await otherTask
+        assert row is not None
+        assert row.name == 'name-0'
+        assert cancelledTask.cancelled()
+
+    async def test_load_caches_for_context(self, database: Database, executed_queries: list):
+        recordLoader = RecordLoader(database=database)
+        async with database.create_context_connection(), recordLoader.create_context():
+            await recordLoader.load_many(table=TestTable, fieldName='id', values=[1, 2, 100])
+            rows = await recordLoader.load_many(table=TestTable, fieldName='id', values=[2, 1, 100])
+            assert [row.name if row else None for row in rows] == ['name-1', 'name-0', None]
+            assert len(executed_queries) == 1
+            await recordLoader.load(table=TestTable, fieldName='id', value=3)
+            assert len(executed_queries) == 2
+        async with database.create_context_connection(), recordLoader.create_context():
+            await recordLoader.load(table=TestTable, fieldName='id', value=1)
+            assert len(executed_queries) == 3
+
+    async def test_load_splits_large_batches(self, database: Database, executed_queries: list):
+        recordLoader = RecordLoader(database=database, maxBatchSize=3)
+        async with database.create_context_connection(), recordLoader.create_context():
+            rows = await recordLoader.load_many(table=TestTable, fieldName='name', values=[f'name-{index}' for index in range(8)])
+        assert [row.id for row in rows] == list(range(1, 9))
+        assert len(executed_queries) == 3
+
+    async def test_load_runs_one_query_at_a_time(self, database: Database, monkeypatch):
+        recordLoader = RecordLoader(database=database)
+        originalExecute = database.execute
+        runningQueryCounts = []
+        runningQueryCount = 0
+
+        async def execute(query, **kwargs):
+            nonlocal runningQueryCount
+            runningQueryCount += 1
+            runningQueryCounts.append(runningQueryCount)
+            await asyncio.sleep(0.01)
+            try:
+                return await originalExecute(query=query, **kwargs)
+            finally:
+                runningQueryCount -= 1
+
+        monkeypatch.setattr(database, 'execute', execute)
+        async with database.create_context_connection(), recordLoader.create_context():
+            rows = await asyncio.gather(recordLoader.load(table=TestTable, fieldName='id', value=1), recordLoader.load(table=TestTable, fieldName='name', value='name-2'))
+        assert [row.id for row in rows] == [1, 3]
+        assert runningQueryCounts == [1, 1]
+
+    async def test_load_without_context(self, database: Database):
+        recordLoader = RecordLoader(database=database)
+        with pytest.raises(InternalServerErrorException):
+            await recordLoader.load(table=TestTable, fieldName='id', value=1)
+
+    async def test_load_propagates_errors(self, database: Database):
+        recordLoader = RecordLoader(database=database)
+        async with recordLoader.create_context():
+            with pytest.raises(InternalServerErrorException):
+                await recordLoader.load_many(table=TestTable, fieldName='id', values=[1, 2])
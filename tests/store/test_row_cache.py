@@ -0,0 +1,111 @@
+import dataclasses
+import datetime
+import decimal
+import enum
+import uuid
+
+import pytest
+
+from core.caching.dict_cache import DictCache
+from core.store.database import Database
+from core.store.retriever import Retriever
+from core.store.row_cache import RowCache
+from core.store.saver import Saver
+from tests.store.conftest import TestTable
+
+
+@dataclasses.dataclass(slots=True)
+class ExampleRecord:
+    id: int
+    name: str
+    date: datetime.datetime | None
+
+
+class ExampleEnum(str, enum.Enum):
+    FIRST = 'first'
+
+
+class TestRowCache:
+
+    @pytest.fixture
+    def rowCache(self) -> RowCache:
+        return RowCache(cache=DictCache())
+
+    async def test_set_and_get_row(self, rowCache: RowCache):
+        values = [1, 'name', None, datetime.datetime(2020, 1, 2, 3, 4, 5, 6)]
+        await rowCache.set_row(table=TestTable, rowId=1, values=values)
+        assert await rowCache.get_row(table=TestTable, rowId=1) == values
+        assert await rowCache.get_row(table=TestTable, rowId=2) is None
+        await rowCache.invalidate_rows(table=TestTable, rowIds=[1, 2])
+        assert await rowCache.get_row(table=TestTable, rowId=1) is None
+
+    async def test_get_row_ignores_invalid_values(self, rowCache: RowCache):
+        await rowCache.cache.set(key=rowCache._get_key(table=TestTable, rowId=1), value='[1]', expirySeconds=60)
+        assert await rowCache.get_row(table=TestTable, rowId=1) is None
+
+    async def test_set_row_skips_values_that_do_not_round_trip(self, rowCache: RowCache):
+        await rowCache.set_row(table=TestTable, rowId=1, values=[1, ExampleEnum.FIRST, None, None])
+        await rowCache.set_row(table=TestTable, rowId=2, values=[2, 'name', None, uuid.UUID(int=2)])
+        await rowCache.set_row(table=TestTable, rowId=3, values=[3, 'name', decimal.Decimal('1.5'), None])
+        await rowCache.set_row(table=TestTable, rowId=4, values=[4, 'name', 4, None])
+        assert [await rowCache.get_row(table=TestTable, rowId=rowId) for rowId in [1, 2, 3, 4]] == [None, None, None, [4, 'name', 4, None]]
+
+    async def test_retriever_reads_through_and_saver_invalidates(self, database: Database, rowCache: RowCache, monkeypatch):
+        retriever = Retriever(database=database, rowCache=rowCache)
+        saver = Saver(database=database, rowCache=rowCache)
+        rowId = await saver._insert_record(table=TestTable, values={'name': 'name', 'date': datetime.datetime(2020, 1, 1)})
+        async with database.create_context_connection():
+            record = await retriever._get_record_by_id(table=TestTable, rowId=rowId, recordType=ExampleRecord)
+        assert record == ExampleRecord(id=rowId, name='name', date=datetime.datetime(2020, 1, 1))
+        executedQueries = []
+        execute = database.execute
+        async def record_execute(*args, **kwargs):
+            executedQueries.append(kwargs['query'])
+            return await execute(*args, **kwargs)
+        monkeypatch.setattr(database, 'execute', record_execute)
+        assert await retriever._get_record_by_id(table=TestTable, rowId=rowId, recordType=ExampleRecord) == record
+        assert executedQueries == []
+        await saver._update_records_by_id(table=TestTable, idValuesMap={rowId: {'name': 'updated'}})
+        async with database.create_context_connection():
+            record = await retriever._get_record_by_id(table=TestTable, rowId=rowId, recordType=ExampleRecord)
+        assert record is not None
+        assert record.name == 'updated'
+        await saver._delete_records_by_id(table=TestTable, rowIds=[rowId])
+        async with database.create_context_connection():
+            assert await retriever._get_record_by_id(table=TestTable, rowId=rowId, recordType=ExampleRecord) is None
+
+    async def test_retriever_does_not_cache_uncommitted_rows(self, database: Database, rowCache: RowCache):
+        retriever = Retriever(database=database, rowCache=rowCache)
+        saver = Saver(database=database, rowCache=rowCache)
+        async with database.create_transaction() as connection:
+            rowId = await saver._insert_record(table=TestTable, values={'name': 'name'}, connection=connection)
+            assert await retriever._get_record_by_id(table=TestTable, rowId=rowId, recordType=ExampleRecord, connection=connection) is not None
+        assert await rowCache.get_row(table=TestTable, rowId=rowId) is None
+        async with database.create_context_connection():
+            await saver._update_records(table=TestTable, where=TestTable.c.id == rowId, values={'name': 'updated'})
+            assert await retriever._get_record_by_id(table=TestTable, rowId=rowId, recordType=ExampleRecord) is not None
+        assert await rowCache.get_row(table=TestTable, rowId=rowId) is None
+
+    async def test_saver_invalidates_after_commit(self, database: Database, rowCache: RowCache):
+        retriever = Retriever(database=database, rowCache=rowCache)
+        saver = Saver(database=database, rowCache=rowCache)
+        rowId = await saver._insert_record(table=TestTable, values={'name': 'name'})
+        async with database.create_context_connection():
+            await retriever._get_record_by_id(table=TestTable, rowId=rowId, recordType=ExampleRecord)
+        assert await rowCache.get_row(table=TestTable, rowId=rowId) is not None
+        async with database.create_transaction() as connection:
+            await saver._update_records(table=TestTable, where=TestTable.c.id == rowId, values={'name': 'updated'}, connection=connection)
+            assert await rowCache.get_row(table=TestTable, rowId=rowId) is not None
+            record = await retriever._get_record_by_id(table=TestTable, rowId=rowId, recordType=ExampleRecord, connection=connection)
+            assert record is not None
+            assert record.name == 'updated'
+        assert await rowCache.get_row(table=TestTable, rowId=rowId) is None
+        async with database.create_context_connection():
+            await retriever._get_record_by_id(table=TestTable, rowId=rowId, recordType=ExampleRecord)
+        with pytest.raises(ValueError):
+            async with database.create_transaction() as connection:
+                await saver._update_records(table=TestTable, where=TestTable.c.id == rowId, values={'name': 'rolled back'}, connection=connection)
+                raise ValueError
+        cachedValues = await rowCache.get_row(table=TestTable, rowId=rowId)
+        assert cachedValues is not None
+        assert cachedValues[1] == 'updated'
@@ -0,0 +1,57 @@
+import dataclasses
+
+import pytest
+import sqlalchemy
+
+from core.exceptions import InternalServerErrorException
+from core.store.row_mapper import RowMapper
+from core.store.row_mapper import create_table_record_type
+
+TestMetadata = sqlalchemy.MetaData()
+
+TestTable = sqlalchemy.Table(
+    'tbl_test',
+    TestMetadata,
+    sqlalchemy.Column(key='id', name='id', type_=sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column(key='name', name='name', type_=sqlalchemy.Text),
+    sqlalchemy.Column(key='value', name='value_column', type_=sqlalchemy.Integer),
+)
+
+
+@dataclasses.dataclass(slots=True)
+class ExampleRecord:
+    value: int
+    name: str
+
+
+@dataclasses.dataclass(slots=True)
+class ExampleNameRecord:
+    name: str
+
+
+class TestRowMapper:
+
+    def test_map_rows(self):
+        rowMapper = RowMapper(columnKeys=['id', 'name', 'value'], recordType=ExampleRecord)
+        records = rowMapper.map_rows(rows=[(1, 'a', 10), (2, 'b', 20)])
+        assert records == [ExampleRecord(value=10, name='a'), ExampleRecord(value=20, name='b')]
+
+    def test_map_row_with_single_field(self):
+        rowMapper = RowMapper(columnKeys=['id', 'name', 'value'], recordType=ExampleNameRecord)
+        assert rowMapper.map_row(row=(1, 'a', 10)) == ExampleNameRecord(name='a')
+
+    def test_missing_columns(self):
+        with pytest.raises(InternalServerErrorException):
+            RowMapper(columnKeys=['id', 'name'], recordType=ExampleRecord)
+
+    def test_non_dataclass_record_type(self):
+        with pytest.raises(InternalServerErrorException):
+            RowMapper(columnKeys=['id', 'name'], recordType=dict)
+
+    def test_create_table_record_type(self):
+        recordType = create_table_record_type(table=TestTable)
+        assert [field.name for field in dataclasses.fields(recordType)] == ['id', 'name', 'value']
+        assert hasattr(recordType, '__slots__')
+        rowMapper = RowMapper(columnKeys=['id', 'name', 'value'], recordType=recordType)
+        record = rowMapper.map_row(row=(1, 'a', 10))
+        assert (record.id, record.name, record.value) == (1, 'a', 10)
@@ -0,0 +1,227 @@
+import datetime
+
+import pytest
+import sqlalchemy
+
+from core.store.database import Database
+from core.store.saver import Saver
+from core.store.saver import SavingException
+from tests.store.conftest import TestTable
+
+
+class TestSaver:
+
+    # NOTE(krishan711): the upsert tests conflict on name so it is made unique here (other tests need repeated names)
+    @staticmethod
+    async def _create_unique_name_index(database: Database) -> None:
+        async with database.create_transaction() as connection:
+            await connection.execute(sqlalchemy.text('CREATE UNIQUE INDEX idx_tbl_test_name ON tbl_test (name)'))
+
+    @pytest.fixture
+    async def database(self, database: Database):
+        await self._create_unique_name_index(database=database)
+        return database
+
+    @pytest.fixture
+    async def psql_database(self, psql_database: Database):
+        await self._create_unique_name_index(database=psql_database)
+        return psql_database
+
+    @pytest.fixture
+    def saver(self, database: Database) -> Saver:
+        return Saver(database=database)
+
+    async def _get_values(self, database: Database) -> dict[str, int]:
+        async with database.create_transaction() as connection:
+            result = await database.execute(query=sqlalchemy.select(TestTable.c.name, TestTable.c.value), connection=connection)
+            return {name: value for name, value in result}
+
+    async def test_insert_records_returns_ids_in_order(self, saver: Saver, database: Database):
+        rowIds = await saver._insert_records(table=TestTable, valuesList=[{'name': f'name-{index}', 'value': index} for index in range(10)])
+        assert len(rowIds) == 10
+        async with database.create_transaction() as connection:
+            result = await database.execute(query=sqlalchemy.select(TestTable.c.id, TestTable.c.value), connection=connection)
+            rowIdValueMap = {rowId: value for rowId, value in result}
+        assert [rowIdValueMap[rowId] for rowId in rowIds] == list(range(10))
+
+    async def test_insert_records_accepts_column_keys(self, saver: Saver, database: Database):
+        rowIds = await saver._insert_records(table=TestTable, valuesList=[{TestTable.c.name: 'name', TestTable.c.value: 1}])
+        assert len(rowIds) == 1
+        assert await self._get_values(database=database) == {'name': 1}
+
+    async def test_insert_records_with_empty_list(self, saver: Saver):
+        rowIds = await saver._insert_records(table=TestTable, valuesList=[])
+        assert rowIds == []
+
+    async def test_insert_records_in_chunks(self, saver: Saver, database: Database, monkeypatch):
+        monkeypatch.setattr('core.store.saver.MAX_QUERY_PARAMETER_COUNT', 9)
+        rowIds = await saver._insert_records(table=TestTable, valuesList=[{'name': f'name-{index}', 'value': index} for index in range(10)])
+        assert len(set(rowIds)) == 10
+        assert len(await self._get_values(database=database)) == 10
+
+    async def test_insert_records_with_different_fields(self, saver: Saver, database: Database):
+        rowIds = await saver._insert_records(table=TestTable, valuesList=[{'name': 'a'}, {'name': 'b', 'value': 2}, {'name': 'c'}, {'value': 4, 'name': 'd'}])
+        assert await self._get_values(database=database) == {'a': None, 'b': 2, 'c': None, 'd': 4}
+        async with database.create_transaction() as connection:
+            result = await database.execute(query=sqlalchemy.select(TestTable.c.id, TestTable.c.name), connection=connection)
+            rowIdNameMap = {rowId: name for rowId, name in result}
+        assert [rowIdNameMap[rowId] for rowId in rowIds] == ['a', 'b', 'c', 'd']
+
+    async def test_insert_records_rolls_back_all_chunks_on_error(self, saver: Saver, database: Database, monkeypatch):
+        monkeypatch.setattr('core.store.saver.MAX_QUERY_PARAMETER_COUNT', 6)
+        with pytest.raises(SavingException):
+            await saver._insert_records(table=TestTable, valuesList=[{'name': f'name-{index}', 'value': index} for index in range(6)] + [{'name': 'name-0', 'value': 0}])
+        assert await self._get_values(database=database) == {}
+        with pytest.raises(SavingException):
+            await saver._upsert_records(table=TestTable, valuesList=[{'name': f'name-{index}', 'value': index} for index in range(6)] + [{'name': None, 'value': 0}], conflictFieldNames=['name'])
+        assert await self._get_values(database=database) == {}
+
+    async def test_upsert_records_inserts_and_updates(self, saver: Saver, database: Database):
+        existingRowIds = await saver._insert_records(table=TestTable, valuesList=[{'name': 'a', 'value': 1}, {'name': 'b', 'value': 2}])
+        rowIds = await saver._upsert_records(table=TestTable, valuesList=[{'name': 'c', 'value': 30}, {'name': 'b', 'value': 20}, {'name': 'a', 'value': 10}], conflictFieldNames=['name'])
+        assert rowIds[1:] == [existingRowIds[1], existingRowIds[0]]
+        assert rowIds[0] not in existingRowIds
+        assert await self._get_values(database=database) == {'a': 10, 'b': 20, 'c': 30}
+
+    async def test_upsert_records_with_different_fields(self, saver: Saver, database: Database):
+        existingRowIds = await saver._insert_records(table=TestTable, valuesList=[{'name': 'a', 'value': 1}, {'name': 'b', 'value': 2}])
+        rowIds = await saver._upsert_records(table=TestTable, valuesList=[{'name': 'a'}, {'name': 'b', 'value': 20}, {'name': 'c', 'value': 30}], conflictFieldNames=['name'])
+        assert rowIds[:2] == existingRowIds
+        assert await self._get_values(database=database) == {'a': 1, 'b': 20, 'c': 30}
+        with pytest.raises(SavingException):
+            await saver._upsert_records(table=TestTable, valuesList=[{'value': 1}], conflictFieldNames=['name'])
+
+    async def test_upsert_records_with_different_fields_and_update_fields(self, saver: Saver, database: Database):
+        date = datetime.datetime(2024, 1, 2, 3, 4, 5)
+        existingRowIds = await saver._insert_records(table=TestTable, valuesList=[{'name': 'a', 'value': 1, 'date': date}, {'name': 'b', 'value': 2, 'date': date}])
+        rowIds = await saver._upsert_records(table=TestTable, valuesList=[{'name': 'a', 'value': 10}, {'name': 'b', 'date': None}], conflictFieldNames=['name'], updateFieldNames=['value', 'date'])
+        assert rowIds == existingRowIds
+        async with database.create_transaction() as connection:
+            result = await database.execute(query=sqlalchemy.select(TestTable.c.name, TestTable.c.value, TestTable.c.date).order_by(TestTable.c.name), connection=connection)
+            assert [tuple(row) for row in result] == [('a', 10, date), ('b', 2, None)]
+
+    async def test_upsert_records_with_no_update_fields(self, saver: Saver, database: Database):
+        existingRowIds = await saver._insert_records(table=TestTable, valuesList=[{'name': 'a', 'value': 1}])
+        rowIds = await saver._upsert_records(table=TestTable, valuesList=[{'name': 'a', 'value': 10}], conflictFieldNames=['name'], updateFieldNames=[])
+        assert rowIds == existingRowIds
+        assert await self._get_values(database=database) == {'a': 1}
+
+    async def test_update_records_by_id(self, saver: Saver, database: Database):
+        rowIds = await saver._insert_records(table=TestTable, valuesList=[{'name': f'name-{index}', 'value': index} for index in range(5)])
+        updatedRowIds = await saver._update_records_by_id(table=TestTable, idValuesMap={
+            rowIds[3]: {'value': 30},
+            rowIds[1]: {'value': 10},
+            rowIds[0]: {TestTable.c.name: 'renamed', TestTable.c.value: None},
+            rowIds[-1] + 100: {'value': 100},
+        })
+        assert updatedRowIds == [rowIds[3], rowIds[1], rowIds[0]]
+        assert await self._get_values(database=database) == {'renamed': None, 'name-1': 10, 'name-2': 2, 'name-3': 30, 'name-4': 4}
+
+    async def test_update_records_by_id_in_chunks(self, saver: Saver, database: Database, monkeypatch):
+        monkeypatch.setattr('core.store.saver.MAX_QUERY_PARAMETER_COUNT', 4)
+        rowIds = await saver._insert_records(table=TestTable, valuesList=[{'name': f'name-{index}', 'value': index} for index in range(5)])
+        updatedRowIds = await saver._update_records_by_id(table=TestTable, idValuesMap={rowId: {'value': index * 10} for index, rowId in enumerate(rowIds)})
+        assert updatedRowIds == rowIds
+        assert await self._get_values(database=database) == {f'name-{index}': index * 10 for index in range(5)}
+
+    async def test_delete_records_by_id(self, saver: Saver, database: Database):
+        rowIds = await saver._insert_records(table=TestTable, valuesList=[{'name': f'name-{index}', 'value': index} for index in range(5)])
+        deletedRowIds = await saver._delete_records_by_id(table=TestTable, rowIds=[rowIds[4], rowIds[0], rowIds[-1] + 100])
+        assert deletedRowIds == [rowIds[4], rowIds[0]]
+        assert await self._get_values(database=database) == {'name-1': 1, 'name-2': 2, 'name-3': 3}
+        assert await saver._delete_records_by_id(table=TestTable, rowIds=[]) == []
+
+    async def test_delete_records_by_id_rolls_back_all_chunks_on_error(self, saver: Saver, database: Database, monkeypatch):
+        rowIds = await saver._insert_records(table=TestTable, valuesList=[{'name': f'name-{index}', 'value': index} for index in range(4)])
+        monkeypatch.setattr('core.store.saver.MAX_QUERY_PARAMETER_COUNT', 2)
+        originalExecute = database.execute
+        executeCount = 0
+
+        async def execute(query, **kwargs):
+            nonlocal executeCount
+            executeCount += 1
+            if executeCount == 2:
+                raise ValueError('failed')
+            return await originalExecute(query=query, **kwargs)
+
+        monkeypatch.setattr(database, 'execute', execute)
+        with pytest.raises(SavingException):
+            await saver._delete_records_by_id(table=TestTable, rowIds=rowIds)
+        monkeypatch.setattr(database, 'execute', originalExecute)
+        assert len(await self._get_values(database=database)) == 4
+
+    async def test_batch(self, saver: Saver, database: Database, monkeypatch):
+        executedQueries = []
+        execute = database.execute
+        async def record_execute(*args, **kwargs):
+            executedQueries.append(kwargs['query'])
+            return await execute(*args, **kwargs)
+        monkeypatch.setattr(database, 'execute', record_execute)
+        async with saver.batch() as saverBatch:
+            rowIdFutures = [await saverBatch.insert_record(table=TestTable, values={'name': f'name-{index}', 'value': index}) for index in range(5)]
+            assert executedQueries == []
+            await saverBatch.flush()
+            rowIds = [rowIdFuture.result() for rowIdFuture in rowIdFutures]
+            for rowId in rowIds[:3]:
+                await saverBatch.update_record(table=TestTable, rowId=rowId, values={'value': 10})
+            await saverBatch.update_record(table=TestTable, rowId=rowIds[0], values={'value': 20})
+            await saverBatch.delete_record(table=TestTable, rowId=rowIds[4])
+        # NOTE(krishan711): one insert, a select and an update (sqlite can't return ids from an executemany update) and one delete
+        assert len(executedQueries) == 4
+        assert await self._get_values(database=database) == {'name-0': 20, 'name-1': 10, 'name-2': 10, 'name-3': 3}
+
+    async def test_batch_inserts_with_different_fields(self, saver: Saver, database: Database):
+        async with saver.batch() as saverBatch:
+            await saverBatch.insert_record(table=TestTable, values={'name': 'b'})
+            await saverBatch.insert_record(table=TestTable, values={'name': 'c', 'value': 3})
+        assert await self._get_values(database=database) == {'b': None, 'c': 3}
+
+    async def test_batch_keeps_operation_order(self, saver: Saver, database: Database):
+        async with saver.batch(maxOperationCount=3) as saverBatch:
+            rowIdFuture = await saverBatch.insert_record(table=TestTable, values={'name': 'name', 'value': 1})
+            await saverBatch.insert_record(table=TestTable, values={'name': 'other', 'value': 2})
+            await saverBatch.delete_record(table=TestTable, rowId=1)
+            assert rowIdFuture.done()
+            await saverBatch.insert_record(table=TestTable, values={'name': 'name', 'value': 3})
+        assert await self._get_values(database=database) == {'name': 3, 'other': 2}
+
+    async def test_batch_rolls_back_on_error(self, saver: Saver, database: Database):
+        with pytest.raises(ValueError):
+            async with saver.batch() as saverBatch:
+                await saverBatch.insert_record(table=TestTable, values={'name': 'name', 'value': 1})
+                rowIdFuture = await saverBatch.insert_record(table=TestTable, values={'name': 'other', 'value': 2})
+                await saverBatch.flush()
+                raise ValueError
+        assert rowIdFuture.done()
+        assert await self._get_values(database=database) == {}
+        with pytest.raises(SavingException):
+            async with saver.batch() as saverBatch:
+                await saverBatch.insert_record(table=TestTable, values={'name': 'name', 'value': 1})
+                rowIdFuture = await saverBatch.insert_record(table=TestTable, values={'name': 'name', 'value': 2})
+        assert rowIdFuture.cancelled()
+        assert await self._get_values(database=database) == {}
+
+    async def test_copy_records(self, saver: Saver, database: Database):
+        async def generate_records():
+            for index in range(25):
+                yield (f'name-{index}', index)
+        recordCount = await saver._copy_records(table=TestTable, fieldNames=['name', 'value'], records=generate_records(), chunkSize=10)
+        assert recordCount == 25
+        assert await self._get_values(database=database) == {f'name-{index}': index for index in range(25)}
+
+    async def test_copy_records_rolls_back_on_error(self, saver: Saver, database: Database):
+        async def generate_records():
+            yield ('name', 1)
+            yield ('name', 2)
+        with pytest.raises(SavingException):
+            await saver._copy_records(table=TestTable, fieldNames=['name', 'value'], records=generate_records(), chunkSize=1)
+        assert await self._get_values(database=database) == {}
+
+    async def test_copy_records_rolls_back_on_error_with_postgres(self, psql_database: Database):
+        async def generate_records():
+            yield ('name-1', 1)
+            yield ('name-2', 2)
+            yield ('name-1', 3)
+        with pytest.raises(SavingException):
+            await Saver(database=psql_database)._copy_records(table=TestTable, fieldNames=['name', 'value'], records=generate_records(), chunkSize=1)
+        assert await self._get_values(database=psql_database) == {}
@@ -108,3 +108,18 @@ class TestAsyncUtil:
         # Total time should be around 0.2 seconds (2 batches * 0.1 seconds each)
         # Allow some tolerance for test execution overhead
         assert 0.15 < (end_time - start_time) < 0.35
+
+    async def test_generate_chunks(self):
+        async def async_range(count: int):
+            for value in range(count):
+                await asyncio.sleep(0)
+                yield value
+        result = [chunk async for chunk in async_util.generate_chunks(async_range(5), chunkSize=2)]
+        assert result == [[0, 1], [2, 3], [4]]
+
+    async def test_generate_chunks_with_empty_iterable(self):
+        async def async_range(count: int):
+            for value in range(count):
+                yield value
+        result = [chunk async for chunk in async_util.generate_chunks(async_range(0), chunkSize=2)]
+        assert result == []